@@ -15,9 +15,24 @@ standard transformations (e.g., rotation, scale, translation) on the
 coordinates.
 """
 
+import array
+import bisect
+import collections
+import functools
+import heapq
+import itertools
 import math
+import mmap
+import multiprocessing
+import operator
+import pickle
+import queue
 import random
+import re
+import struct
 import sys
+import threading
+import time
 
 from math import frexp, copysign
 from sys import float_info
@@ -55,6 +70,20 @@ def manhattan(point1, point2):
     return abs(point1[0] - point2[0]) + abs(point1[1] - point2[1])
 
 
+def euclidean(point1, point2):
+    """Computes distance between 2D points using euclidean metric
+
+    :param point1: 1st point
+    :type point1: list
+    :param point2: 2nd point
+    :type point2: list
+    :returns: Distance between point1 and point2
+    :rtype: float
+    """
+
+    return math.hypot(point1[0] - point2[0], point1[1] - point2[1])
+
+
 def hilbertrot(n, x, y, rx, ry):
     """Rotates and flips a quadrant appropriately for the Hilbert scan
     generator. See https://en.wikipedia.org/wiki/Hilbert_curve.
@@ -66,13 +95,792 @@ def hilbertrot(n, x, y, rx, ry):
         return y, x
     return x, y
 
+
+def hilbertd2xy(size, distance):
+    """Convert a distance along a Hilbert curve filling a square of the given
+    power of two size into x and y coordinates. See
+    https://en.wikipedia.org/wiki/Hilbert_curve.
+    """
+    t = distance
+    x = 0
+    y = 0
+    s = 1
+    while (s < size):
+        rx = 1 & (t // 2)
+        ry = 1 & (t ^ rx)
+        x, y = hilbertrot(s, x, y, rx, ry)
+        x += s * rx
+        y += s * ry
+        t //= 4
+        s *= 2
+    return x, y
+
+
+def hilbertxy2d(size, x, y):
+    """Convert x and y coordinates in a square of the given power of two size
+    into a distance along a Hilbert curve. This is the inverse of
+    hilbertd2xy.
+    """
+    distance = 0
+    s = size // 2
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        distance += s * s * ((3 * rx) ^ ry)
+        x, y = hilbertrot(s, x - s * rx, y - s * ry, rx, ry)
+        s //= 2
+    return distance
+
+
+def hilbertaxes(distance, bits, ndims):
+    """Convert a distance along a Hilbert curve filling an ndims dimensional
+    cube of side 2**bits into coordinates. Uses the transpose algorithm of
+    J. Skilling, "Programming the Hilbert curve", AIP Conf. Proc. 707, 2004.
+    """
+
+    # Distribute the distance bits round-robin over the transposed axes
+    axes = [0] * ndims
+    for k in range(bits * ndims):
+        if distance >> (bits * ndims - 1 - k) & 1:
+            axes[k % ndims] |= 1 << (bits - 1 - k // ndims)
+
+    # Gray decode
+    t = axes[ndims - 1] >> 1
+    for i in range(ndims - 1, 0, -1):
+        axes[i] ^= axes[i - 1]
+    axes[0] ^= t
+
+    # Undo excess work
+    q = 2
+    while q < 1 << bits:
+        p = q - 1
+        for i in range(ndims - 1, -1, -1):
+            if axes[i] & q:
+                axes[0] ^= p
+            else:
+                t = (axes[0] ^ axes[i]) & p
+                axes[0] ^= t
+                axes[i] ^= t
+        q <<= 1
+    return tuple(axes)
+
+# ======================================================================
+# Scan containers
+# ----------------------------------------------------------------------
+
+
+class PointBuffer(object):
+    """Batch of points stored as parallel arrays of x and y coordinates.
+    Patterns that support a chunked output mode yield these instead of
+    individual points. The coordinate arrays support the buffer protocol so
+    they can be wrapped without copying (e.g., numpy.frombuffer).
+    """
+
+    def __init__(self, xs=(), ys=(), typecode="q"):
+        """
+        :param xs: x-coordinates
+        :type xs: sequence
+        :param ys: y-coordinates
+        :type ys: sequence
+        :param typecode: Array type code of coordinates (default = "q")
+        :type typecode: str
+        """
+        if not isinstance(xs, array.array):
+            xs = array.array(typecode, xs)
+        if not isinstance(ys, array.array):
+            ys = array.array(typecode, ys)
+        if len(xs) != len(ys):
+            raise ValueError("Coordinate arrays must have the same length")
+        self.xs = xs
+        self.ys = ys
+
+    def __eq__(self, other):
+        if not isinstance(other, PointBuffer):
+            return NotImplemented
+        return self.xs == other.xs and self.ys == other.ys
+
+    def __getitem__(self, index):
+        return self.xs[index], self.ys[index]
+
+    def __iter__(self):
+        return zip(self.xs, self.ys)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __repr__(self):
+        return "PointBuffer({!r})".format(self.tolist())
+
+    def asarray(self):
+        """Convert points to an (n, 2) numpy array. Requires numpy.
+
+        :returns: Points array
+        :rtype: numpy.ndarray
+        """
+        import numpy
+        points = numpy.empty((len(self), 2), dtype=self.xs.typecode)
+        points[:, 0] = numpy.frombuffer(self.xs, dtype=self.xs.typecode)
+        points[:, 1] = numpy.frombuffer(self.ys, dtype=self.ys.typecode)
+        return points
+
+    def tolist(self):
+        """Convert points to a list of coordinate tuples
+
+        :returns: Points list
+        :rtype: list
+        """
+        return list(zip(self.xs, self.ys))
+
+
+class PointBuffer3D(object):
+    """Batch of 3D points stored as parallel arrays of x, y and z coordinates.
+    This is the 3D counterpart of PointBuffer.
+    """
+
+    def __init__(self, xs=(), ys=(), zs=(), typecode="q"):
+        """
+        :param xs: x-coordinates
+        :type xs: sequence
+        :param ys: y-coordinates
+        :type ys: sequence
+        :param zs: z-coordinates
+        :type zs: sequence
+        :param typecode: Array type code of coordinates (default = "q")
+        :type typecode: str
+        """
+        if not isinstance(xs, array.array):
+            xs = array.array(typecode, xs)
+        if not isinstance(ys, array.array):
+            ys = array.array(typecode, ys)
+        if not isinstance(zs, array.array):
+            zs = array.array(typecode, zs)
+        if not len(xs) == len(ys) == len(zs):
+            raise ValueError("Coordinate arrays must have the same length")
+        self.xs = xs
+        self.ys = ys
+        self.zs = zs
+
+    def __eq__(self, other):
+        if not isinstance(other, PointBuffer3D):
+            return NotImplemented
+        return (self.xs == other.xs and self.ys == other.ys and
+                self.zs == other.zs)
+
+    def __getitem__(self, index):
+        return self.xs[index], self.ys[index], self.zs[index]
+
+    def __iter__(self):
+        return zip(self.xs, self.ys, self.zs)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __repr__(self):
+        return "PointBuffer3D({!r})".format(self.tolist())
+
+    def asarray(self):
+        """Convert points to an (n, 3) numpy array. Requires numpy.
+
+        :returns: Points array
+        :rtype: numpy.ndarray
+        """
+        import numpy
+        points = numpy.empty((len(self), 3), dtype=self.xs.typecode)
+        points[:, 0] = numpy.frombuffer(self.xs, dtype=self.xs.typecode)
+        points[:, 1] = numpy.frombuffer(self.ys, dtype=self.ys.typecode)
+        points[:, 2] = numpy.frombuffer(self.zs, dtype=self.zs.typecode)
+        return points
+
+    def tolist(self):
+        """Convert points to a list of coordinate tuples
+
+        :returns: Points list
+        :rtype: list
+        """
+        return list(zip(self.xs, self.ys, self.zs))
+
+
+def _pointbuffer(*columns):
+    """PointBuffer (2 columns) or PointBuffer3D (3 columns) of the given
+    coordinate columns using integer arrays unless a coordinate is a float
+    """
+    buffer = PointBuffer if len(columns) == 2 else PointBuffer3D
+    try:
+        return buffer(*columns)
+    except TypeError:
+        return buffer(*columns, typecode="d")
+
+
+def _buffercolumns(points):
+    """Coordinate arrays of a PointBuffer or PointBuffer3D
+    """
+    if isinstance(points, PointBuffer3D):
+        return points.xs, points.ys, points.zs
+    return points.xs, points.ys
+
+
+class PixelSet(object):
+    """Set of visited pixels. Pixels inside the given bounds are tracked in a
+    compact bitset using one bit per pixel while pixels outside the bounds
+    (or all pixels if no bounds are given) fall back to a hashed set.
+    Coordinates inside the bounds must be integers.
+    """
+
+    def __init__(self, minx=None, maxx=None, miny=None, maxy=None):
+        """
+        :param minx: Minimum x-coordinate of bitset (default = None)
+        :type minx: int
+        :param maxx: Maximum x-coordinate of bitset (default = None)
+        :type maxx: int
+        :param miny: Minimum y-coordinate of bitset (default = None)
+        :type miny: int
+        :param maxy: Maximum y-coordinate of bitset (default = None)
+        :type maxy: int
+        """
+        bounds = (minx, maxx, miny, maxy)
+        if any(bound is None for bound in bounds):
+            if any(bound is not None for bound in bounds):
+                raise ValueError("Bounds must be all set or all None")
+            minx, maxx, miny, maxy = 1, 0, 1, 0
+        if maxx < minx - 1 or maxy < miny - 1:
+            raise ValueError("Bounds must not be inverted")
+        self.minx = minx
+        self.maxx = maxx
+        self.miny = miny
+        self.maxy = maxy
+        self.width = maxx - minx + 1
+        self.bits = bytearray((self.width * (maxy - miny + 1) + 7) // 8)
+        self.nbits = 0
+        self.points = set()
+
+    def __contains__(self, point):
+        x, y = point
+        if self.minx <= x <= self.maxx and self.miny <= y <= self.maxy:
+            i = int(y - self.miny) * self.width + int(x - self.minx)
+            return bool(self.bits[i >> 3] & (1 << (i & 7)))
+        return (x, y) in self.points
+
+    def __len__(self):
+        return self.nbits + len(self.points)
+
+    def add(self, x, y):
+        """Add pixel to set
+
+        :param x: x-coordinate
+        :type x: int
+        :param y: y-coordinate
+        :type y: int
+        :returns: True if pixel was not already in the set
+        :rtype: bool
+        """
+        if self.minx <= x <= self.maxx and self.miny <= y <= self.maxy:
+            i = int(y - self.miny) * self.width + int(x - self.minx)
+            byte, bit = i >> 3, 1 << (i & 7)
+            if self.bits[byte] & bit:
+                return False
+            self.bits[byte] |= bit
+            self.nbits += 1
+            return True
+        if (x, y) in self.points:
+            return False
+        self.points.add((x, y))
+        return True
+
+
+class RunLengthMask(object):
+    """Run-length encoding of the set pixels of a 2D mask. Each row is stored
+    as a list of inclusive (xstart, xend) runs of set pixels. The encoding is
+    computed once and can be reused by any number of mask scans.
+    """
+
+    RUNS = re.compile(b"[^\\x00]+")
+
+    def __init__(self, mask, width=None):
+        """
+        :param mask: Mask indexed as mask[y][x] (e.g., numpy array or list of
+                     rows) or a flat bytes-like object of row-major values
+        :type mask: sequence
+        :param width: Row width, required for flat bytes-like masks
+        :type width: int
+        """
+        if isinstance(mask, (bytes, bytearray, memoryview)):
+            if width is None or width <= 0:
+                raise ValueError("Width must be positive for a flat mask")
+            data = bytes(mask)
+            if len(data) % width != 0:
+                raise ValueError("Mask size must be a multiple of width")
+            rows = [data[i:i + width] for i in range(0, len(data), width)]
+        else:
+            rows = [self.rowbytes(row) for row in mask]
+            width = max([len(row) for row in rows] + [0])
+
+        self.width = width
+        self.height = len(rows)
+        self.runs = [[(m.start(), m.end() - 1)
+                      for m in self.RUNS.finditer(row)]
+                     for row in rows]
+        self.count = sum(xb - xa + 1 for runs in self.runs for xa, xb in runs)
+
+    @staticmethod
+    def rowbytes(row):
+        """Convert a mask row to bytes with one non-zero byte per set pixel
+        """
+        if isinstance(row, (bytes, bytearray, memoryview)):
+            return bytes(row)
+        if hasattr(row, "astype") and hasattr(row, "tobytes"):
+            return row.astype(bool).tobytes()
+        return bytes(1 if value else 0 for value in row)
+
+
+class Span(collections.namedtuple("Span", ["y", "xstart", "xend",
+                                           "direction"])):
+    """Inclusive run of pixels on row y from xstart to xend stepping by
+    direction (1 or -1). Scans yield spans from their spans() method and the
+    translation, reflection and clip transformations operate on them
+    directly.
+    """
+
+    __slots__ = ()
+
+    @property
+    def xs(self):
+        """Range of the x-coordinates in span order
+        """
+        return range(self.xstart, self.xend + self.direction, self.direction)
+
+
+class Region(object):
+    """Set of pixels stored as per-row lists of inclusive (xstart, xend) runs
+    that are sorted, disjoint and not adjacent. Unions, intersections and
+    differences of regions are computed on the runs so their cost depends on
+    the number of runs and not the number of pixels. Scan a region with
+    regionscan.
+    """
+
+    def __init__(self, runs=()):
+        """
+        :param runs: Inclusive (y, xstart, xend) row runs in any order, which
+                     may overlap and run in either x direction
+        :type runs: iterable
+        """
+        rows = collections.defaultdict(list)
+        for y, xa, xb in runs:
+            rows[y].append((min(xa, xb), max(xa, xb)))
+        self.rows = {}
+        for y in sorted(rows):
+            self.rows[y] = _unionruns(sorted(rows[y]))
+        self.count = sum(xb - xa + 1 for runs in self.rows.values()
+                         for xa, xb in runs)
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __contains__(self, point):
+        x, y = point
+        runs = self.rows.get(y)
+        if not runs:
+            return False
+        i = bisect.bisect_right(runs, (x, math.inf)) - 1
+        return i >= 0 and runs[i][0] <= x <= runs[i][1]
+
+    def __eq__(self, other):
+        return isinstance(other, Region) and self.rows == other.rows
+
+    def __len__(self):
+        return self.count
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __repr__(self):
+        return "Region(count=%d, rows=%d)" % (self.count, len(self.rows))
+
+    def __sub__(self, other):
+        return self.difference(other)
+
+    @classmethod
+    def rectangle(cls, xi, yi, xf, yf):
+        """Region of the pixels of a rectangle
+
+        :param xi: Initial x-coordinate
+        :type xi: int
+        :param yi: Initial y-coordinate
+        :type yi: int
+        :param xf: Final x-coordinate
+        :type xf: int
+        :param yf: Final y-coordinate
+        :type yf: int
+        """
+        return cls((y, xi, xf) for y in range(min(yi, yf), max(yi, yf) + 1))
+
+    @classmethod
+    def ring(cls, x0, y0, r1, r2, metric=chebyshev):
+        """Region of the pixels whose distance from a center point is between
+        two radii (inclusive), i.e. the pixels of the ringscan rings
+
+        :param x0: Center x-coordinate
+        :type x0: int
+        :param y0: Center y-coordinate
+        :type y0: int
+        :param r1: Initial radius
+        :type r1: int
+        :param r2: Final radius
+        :type r2: int
+        :param metric: Distance metric chebyshev, manhattan or euclidean
+        :type metric: function
+        """
+        if r1 < 0:
+            raise ValueError("Initial radius must be non-negative")
+        if r2 < 0:
+            raise ValueError("Final radius must be non-negative")
+        if metric not in (chebyshev, manhattan, euclidean):
+            raise ValueError("Metric must be chebyshev, manhattan or "
+                             "euclidean")
+        rmin, rmax = min(r1, r2), max(r1, r2)
+
+        # Span of |x - x0| offsets on each row
+        def offsets(dy):
+            if metric is chebyshev:
+                return (0 if dy >= rmin else rmin), rmax
+            if metric is manhattan:
+                return max(rmin - dy, 0), rmax - dy
+            inner = rmin * rmin - dy * dy
+            lo = math.isqrt(inner - 1) + 1 if inner > 0 else 0
+            return lo, math.isqrt(rmax * rmax - dy * dy)
+
+        runs = []
+        for y in range(y0 - rmax, y0 + rmax + 1):
+            lo, hi = offsets(abs(y - y0))
+            if lo > hi:
+                continue
+            if lo == 0:
+                runs.append((y, x0 - hi, x0 + hi))
+            else:
+                runs.extend([(y, x0 - hi, x0 - lo), (y, x0 + lo, x0 + hi)])
+        return cls(runs)
+
+    @classmethod
+    def polygon(cls, vertices):
+        """Region of the pixels inside a polygon by the even-odd rule. Edges
+        are half-open so pixels on the right and top edges are outside, which
+        keeps polygons that share an edge from overlapping.
+
+        :param vertices: Polygon (x, y) vertices
+        :type vertices: sequence
+        """
+        vertices = list(vertices)
+        if len(vertices) < 3:
+            raise ValueError("Polygon must have at least 3 vertices")
+        edges = [(x1, y1, x2, y2) if y1 < y2 else (x2, y2, x1, y1)
+                 for (x1, y1), (x2, y2) in zip(vertices, vertices[1:] +
+                                               vertices[:1])
+                 if y1 != y2]
+        ys = [y for _, y in vertices]
+
+        runs = []
+        for y in range(int(math.ceil(min(ys))), int(math.ceil(max(ys)))):
+
+            # First pixel at or after each edge crossing, computed exactly
+            # for integer vertices, then pixels up to before the next one
+            crossings = sorted(
+                int(-(-(x1 * (y2 - y1) + (x2 - x1) * (y - y1)) // (y2 - y1)))
+                for x1, y1, x2, y2 in edges if y1 <= y < y2)
+            for xa, xb in zip(crossings[::2], crossings[1::2]):
+                if xa < xb:
+                    runs.append((y, xa, xb - 1))
+        return cls(runs)
+
+    @classmethod
+    def mask(cls, mask, width=None):
+        """Region of the set pixels of a mask
+
+        :param mask: Mask indexed as mask[y][x], flat bytes-like mask or
+                     RunLengthMask
+        :type mask: sequence
+        :param width: Row width, required for flat bytes-like masks
+        :type width: int
+        """
+        if not isinstance(mask, RunLengthMask):
+            mask = RunLengthMask(mask, width)
+        return cls((y, xa, xb) for y, runs in enumerate(mask.runs)
+                   for xa, xb in runs)
+
+    @classmethod
+    def fromscan(cls, scan):
+        """Region of the points of a scan of integer coordinates
+
+        :param scan: Pixel scan generator
+        :type scan: function
+        """
+        rows = collections.defaultdict(list)
+        for x, y in _flatten(scan):
+            rows[y].append(x)
+        return cls((y, x, x) for y, xs in rows.items() for x in xs)
+
+    def difference(self, other):
+        """Region of the pixels in this region and not in another
+
+        :param other: Region to remove
+        :type other: Region
+        """
+        return self.combine(other, _differenceruns, True, False)
+
+    def intersection(self, other):
+        """Region of the pixels in both this region and another
+
+        :param other: Region to intersect
+        :type other: Region
+        """
+        return self.combine(other, _intersectionruns, False, False)
+
+    def union(self, other):
+        """Region of the pixels in either this region or another
+
+        :param other: Region to add
+        :type other: Region
+        """
+        return self.combine(other, _unionruns, True, True)
+
+    def combine(self, other, operation, left, right):
+        """Combine the runs of each row with another region. Rows found in
+        only one region are kept as is if left or right is True.
+        """
+        region = Region()
+        for y in sorted(self.rows.keys() | other.rows.keys()):
+            a, b = self.rows.get(y), other.rows.get(y)
+            if a and b:
+                runs = operation(a, b)
+            elif a:
+                runs = a if left else None
+            else:
+                runs = b if right else None
+            if runs:
+                region.rows[y] = runs
+                region.count += sum(xb - xa + 1 for xa, xb in runs)
+        return region
+
+    def runs(self):
+        """Generate the inclusive (y, xstart, xend) runs sorted by row then
+        x-coordinate
+        """
+        for y, runs in self.rows.items():
+            for xa, xb in runs:
+                yield y, xa, xb
+
+
+def _unionruns(a, b=()):
+    """Merge sorted lists of inclusive runs into sorted disjoint runs,
+    joining runs that overlap or are adjacent
+    """
+    merged = []
+    for xa, xb in heapq.merge(a, b):
+        if merged and xa <= merged[-1][1] + 1:
+            if xb > merged[-1][1]:
+                merged[-1] = (merged[-1][0], xb)
+        else:
+            merged.append((xa, xb))
+    return merged
+
+
+def _intersectionruns(a, b):
+    """Intersect two sorted lists of disjoint inclusive runs
+    """
+    runs, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        xa, xb = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if xa <= xb:
+            runs.append((xa, xb))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return runs
+
+
+def _differenceruns(a, b):
+    """Subtract a sorted list of disjoint inclusive runs from another
+    """
+    runs, j = [], 0
+    for xa, xb in a:
+
+        # Skip runs ending before this one then cut out overlapping runs
+        while j < len(b) and b[j][1] < xa:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] <= xb:
+            if b[k][0] > xa:
+                runs.append((xa, b[k][0] - 1))
+            xa = b[k][1] + 1
+            k += 1
+        if xa <= xb:
+            runs.append((xa, xb))
+    return runs
+
+
 # ======================================================================
 # Scan transformations
 # ----------------------------------------------------------------------
 
 
+def _privaterandom(state):
+    """Private random number generator with the given state
+    """
+    rng = random.Random()
+    rng.setstate(state)
+    return rng
+
+
+class _GlobalRandom(object):
+    """Stand-in pickled in place of the global random module generator. It
+    unpickles to a private generator with the global state at pickling time.
+    Scans pickled together share the same restored generator.
+    """
+
+    def __reduce__(self):
+        return _privaterandom, (random.getstate(),)
+
+
+_GLOBALRANDOM = _GlobalRandom()
+
+
+def _picklestate(obj):
+    """Copy of the attributes of a scan for pickling. A global random module
+    generator is replaced by a stand-in that restores its state.
+    """
+    state = obj.__dict__.copy()
+    if state.get("rng") is random:
+        state["rng"] = _GLOBALRANDOM
+    return state
+
+
+def _lengthhint(scan):
+    """Length hint of an upstream scan or NotImplemented if it is unknown
+    """
+    hint = operator.length_hint(scan, -1)
+    return NotImplemented if hint < 0 else hint
+
+
+def _isbatch(point):
+    """True if an item of a scan is a batch of points: a PointBuffer or a
+    list or numpy batch of the batch transformation
+    """
+    if isinstance(point, tuple):
+        return False
+    if isinstance(point, PointBuffer):
+        return True
+    if isinstance(point, list):
+        return len(point) > 0 and isinstance(point[0], tuple)
+    return getattr(point, "ndim", None) == 2
+
+
+def _batchbuffer(points):
+    """PointBuffer of a batch of points
+    """
+    if isinstance(points, PointBuffer):
+        return points
+    if isinstance(points, list):
+        return _pointbuffer(*zip(*points))
+    return _pointbuffer(points[:, 0].tolist(), points[:, 1].tolist())
+
+
+def _rebatch(chunk, points):
+    """Convert a PointBuffer chunk to the batch type of the given points
+    """
+    if isinstance(points, PointBuffer):
+        return chunk
+    if isinstance(points, list):
+        return chunk.tolist()
+    return chunk.asarray()
+
+
+class batch(object):
+    """Group points into batches of a fixed size to amortize the per-point
+    overhead of the transformations downstream. Upstream PointBuffer chunks
+    are regrouped to the batch size without unpacking their points. The
+    transformations process batches of any output type a whole batch at a
+    time and yield batches of the same type.
+    """
+
+    def __init__(self, scan, size, output="buffer"):
+        """
+        :param scan: Pixel scan generator
+        :type scan: function
+        :param size: Number of points per batch (the last may be smaller)
+        :type size: int
+        :param output: Batch type "buffer" for PointBuffer, "list" for lists
+                       of points or "numpy" for numpy arrays, which requires
+                       numpy (default = "buffer")
+        :type output: str
+        """
+        if size <= 0:
+            raise ValueError("Batch size must be positive")
+        if output not in ("buffer", "list", "numpy"):
+            raise ValueError("Output must be 'buffer', 'list' or 'numpy'")
+        self.scan = scan
+        self.size = size
+        self.output = output
+        self.columns = None
+        self.exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __length_hint__(self):
+        hint = _lengthhint(self.scan)
+        if hint is NotImplemented:
+            return hint
+        if self.columns is not None:
+            hint += len(self.columns[0])
+        return -(-hint // self.size)
+
+    def __next__(self):
+        """Next point in iteration
+        """
+        size = self.size
+        while not self.exhausted and (self.columns is None or
+                                      len(self.columns[0]) < size):
+            point = next(self.scan, None)
+            if point is None:
+                self.exhausted = True
+            elif isinstance(point, (PointBuffer, PointBuffer3D)):
+                self.extend(_buffercolumns(point))
+            elif isinstance(point, Span):
+                xs = point.xs
+                self.extend((xs, itertools.repeat(point.y, len(xs))))
+            else:
+                need = size - (0 if self.columns is None else
+                               len(self.columns[0]))
+                points = [point]
+                points.extend(itertools.islice(self.scan, need - 1))
+                self.extend(zip(*points))
+
+        if self.columns is None or len(self.columns[0]) == 0:
+            raise StopIteration("Batches exhausted")
+        columns = [column[:size] for column in self.columns]
+        for column in self.columns:
+            del column[:size]
+
+        if self.output == "list":
+            return list(zip(*columns))
+        points = _pointbuffer(*columns)
+        if self.output == "numpy":
+            return points.asarray()
+        return points
+
+    def extend(self, columns):
+        """Append coordinate columns to the pending points
+        """
+        if self.columns is None:
+            self.columns = [list(column) for column in columns]
+            return
+        for pending, column in zip(self.columns, columns):
+            pending.extend(column)
+
+
 class clip(object):
-    """Clip coordinates that exceed boundary
+    """Clip coordinates that exceed boundary. PointBuffer chunks from the
+    upstream scan are clipped a whole chunk at a time and spans are cut to
+    the boundary, or split into the runs accepted by the predicate.
     """
     def __init__(self,
                  scan,
@@ -81,7 +889,8 @@ class clip(object):
                  miny=-sys.maxsize,
                  maxy=sys.maxsize,
                  predicate=None,
-                 abort=False):
+                 abort=False,
+                 vectorized=False):
 
         """
         :param scan: Pixel scan generator
@@ -100,6 +909,12 @@ class clip(object):
         :type predicate: function
         :param abort: Abort iteration if boundary is crossed
         :type abort: bool
+        :param vectorized: True if predicate takes arrays of x and y
+                           coordinates and returns a sequence of booleans.
+                           The arrays are numpy arrays if numpy is
+                           installed, otherwise array.array
+                           (default = False)
+        :type vectorized: bool
         """
         self.scan = scan
         self.minx = minx
@@ -108,16 +923,41 @@ class clip(object):
         self.maxy = maxy
         self.predicate = predicate
         self.abort = abort
+        self.vectorized = vectorized
+        self.aborted = False
+        self.spans = []
 
     def __iter__(self):
         return self
 
+    def __length_hint__(self):
+        # Upper bound since points may be clipped
+        if self.aborted:
+            return len(self.spans)
+        hint = _lengthhint(self.scan)
+        if hint is NotImplemented:
+            return hint
+        return hint + len(self.spans)
+
     def __next__(self):
         """Next point in iteration
         """
         while True:
-            x, y = next(self.scan)
-            if self.predicate is not None and not self.predicate(x, y):
+            if self.spans:
+                return self.spans.pop()
+            if self.aborted:
+                raise StopIteration("Boundary crossed!")
+            point = next(self.scan)
+            if _isbatch(point):
+                chunk = self.clipchunk(_batchbuffer(point))
+                if len(chunk) > 0:
+                    return _rebatch(chunk, point)
+                continue
+            if isinstance(point, Span):
+                self.spans = self.clipspan(point)[::-1]
+                continue
+            x, y = point
+            if self.predicate is not None and not self.accept(x, y):
                 if self.abort:
                     raise StopIteration("Boundary crossed!")
             elif (x < self.minx or
@@ -129,6 +969,272 @@ class clip(object):
             else:
                 return x, y
 
+    def accept(self, x, y):
+        """Evaluate predicate on a single point
+        """
+        if self.vectorized:
+            return self.evaluate([x], [y])[0]
+        return self.predicate(x, y)
+
+    def evaluate(self, xs, ys):
+        """Evaluate a vectorized predicate on numpy arrays of the coordinates
+        if numpy is installed, otherwise on array.array
+        """
+        xs, ys = _buffercolumns(_pointbuffer(xs, ys))
+        try:
+            import numpy
+        except ImportError:
+            return self.predicate(xs, ys)
+        return self.predicate(numpy.asarray(xs), numpy.asarray(ys))
+
+    def clipchunk(self, chunk):
+        """Clip a chunk of points keeping their order. If aborting then only
+        the points before the first clipped point are kept.
+        """
+        xs, ys = chunk.xs, chunk.ys
+        minx, maxx, miny, maxy = self.minx, self.maxx, self.miny, self.maxy
+        bounded = (minx, maxx, miny, maxy) != (-sys.maxsize, sys.maxsize,
+                                               -sys.maxsize, sys.maxsize)
+        if self.predicate is None:
+            if not bounded:
+                return chunk
+            keep = [minx <= x <= maxx and miny <= y <= maxy
+                    for x, y in zip(xs, ys)]
+        else:
+            if self.vectorized:
+                keep = self.evaluate(xs, ys)
+            else:
+                keep = map(self.predicate, xs, ys)
+            if bounded:
+                keep = [bool(k) and minx <= x <= maxx and miny <= y <= maxy
+                        for k, x, y in zip(keep, xs, ys)]
+            else:
+                keep = [bool(k) for k in keep]
+
+        if self.abort:
+            if False in keep:
+                self.aborted = True
+                n = keep.index(False)
+                return PointBuffer(xs[:n], ys[:n])
+            return chunk
+        return PointBuffer(itertools.compress(xs, keep),
+                           itertools.compress(ys, keep), xs.typecode)
+
+    def clipspan(self, span):
+        """Cut a span to the boundary and split it into the runs accepted by
+        the predicate. If aborting then only the run before the first clipped
+        point is kept.
+        """
+        y, xa, _, direction = span
+        xs = span.xs
+        first, last = 0, len(xs) - 1
+
+        # Span offsets of the first and last points inside the boundary
+        if not self.miny <= y <= self.maxy:
+            first = len(xs)
+        elif direction == 1:
+            first = max(first, int(math.ceil(self.minx - xa)))
+            last = min(last, int(math.floor(self.maxx - xa)))
+        else:
+            first = max(first, int(math.ceil(xa - self.maxx)))
+            last = min(last, int(math.floor(xa - self.minx)))
+
+        runs = []
+        if first <= last and self.predicate is None:
+            runs.append((first, last))
+        elif first <= last:
+            if self.vectorized:
+                keep = self.evaluate(xs[first:last + 1],
+                                     [y] * (last - first + 1))
+            else:
+                keep = [self.predicate(x, y) for x in xs[first:last + 1]]
+            start = None
+            for i, k in enumerate(keep, first):
+                if k and start is None:
+                    start = i
+                elif not k and start is not None:
+                    runs.append((start, i - 1))
+                    start = None
+            if start is not None:
+                runs.append((start, last))
+
+        if self.abort and runs != [(0, len(xs) - 1)]:
+            self.aborted = True
+            runs = runs[:1] if runs and runs[0][0] == 0 else []
+        return [Span(y, xs[a], xs[b], direction) for a, b in runs]
+
+
+class prefetch(object):
+    """Compute the upcoming points of a scan in the background while the
+    current ones are processed. Points are generated a batch at a time by a
+    worker thread, or a worker process for CPU bound scans, into a queue
+    holding a bounded number of batches. Exceptions raised by the scan are
+    raised again by the consumer, and a RuntimeError is raised if the worker
+    dies without finishing the scan. The scan must not be used elsewhere while
+    it is prefetched and a process worker requires a picklable scan. Call
+    close, or use prefetch as a context manager, to stop the worker early.
+    """
+
+    def __init__(self, scan, batches=4, batchsize=1024, process=False):
+        """
+        :param scan: Pixel scan generator
+        :type scan: function
+        :param batches: Maximum number of batches queued (default = 4)
+        :type batches: int
+        :param batchsize: Number of points per batch (default = 1024)
+        :type batchsize: int
+        :param process: True to generate the points in a worker process
+                        instead of a thread (default = False)
+        :type process: bool
+        """
+        if batches <= 0:
+            raise ValueError("Number of batches must be positive")
+        if batchsize <= 0:
+            raise ValueError("Batch size must be positive")
+
+        self.total = _lengthhint(scan)
+        self.count = 0
+        self.batch = []
+        self.position = 0
+        self.done = False
+
+        # Queue depth metrics sampled before each batch is fetched
+        self.fetched = 0
+        self.stalls = 0
+        self.maxdepth = 0
+        self.depths = 0
+
+        if process:
+            context = multiprocessing.get_context()
+            self.queue = context.Queue(batches)
+            self.stop = context.Event()
+            worker = context.Process
+        else:
+            self.queue = queue.Queue(batches)
+            self.stop = threading.Event()
+            worker = threading.Thread
+        self.process = process
+        self.worker = worker(target=_prefetchbatches,
+                             args=(scan, self.queue, self.stop, batchsize,
+                                   process),
+                             daemon=True)
+        self.worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return self
+
+    def __length_hint__(self):
+        if self.total is NotImplemented:
+            return self.total
+        return max(self.total - self.count, 0)
+
+    def __next__(self):
+        """Next point in iteration
+        """
+        while self.position >= len(self.batch):
+            if self.done:
+                raise StopIteration("Prefetch exhausted")
+            self.fetch()
+        self.position += 1
+        self.count += 1
+        return self.batch[self.position-1]
+
+    def close(self):
+        """Stop the worker and wait for it to finish
+        """
+        self.done = True
+        self.batch, self.position = [], 0
+        self.stop.set()
+        if self.process:
+            self.queue.cancel_join_thread()
+            self.worker.join(1)
+            if self.worker.is_alive():
+                self.worker.terminate()
+        else:
+            self.worker.join()
+
+    def fetch(self):
+        """Wait for the next batch from the worker
+        """
+        try:
+            depth = self.queue.qsize()
+        except NotImplementedError:
+            depth = 0
+        self.fetched += 1
+        self.stalls += depth == 0
+        self.maxdepth = max(self.maxdepth, depth)
+        self.depths += depth
+
+        # Poll so that a worker that died without a last message is noticed
+        while True:
+            try:
+                kind, item = self.queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self.worker.is_alive():
+                    continue
+            try:
+                kind, item = self.queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                self.close()
+                raise RuntimeError("Prefetch worker stopped")
+        if kind == "batch":
+            self.batch, self.position = item, 0
+            return
+        self.close()
+        if kind == "error":
+            raise item
+
+    @property
+    def meandepth(self):
+        """Mean number of queued batches when a batch was fetched
+        """
+        return self.depths / self.fetched if self.fetched > 0 else 0.0
+
+
+def _prefetchbatches(scan, batches, stop, batchsize, process):
+    """Put batches of scan points in a queue until the scan is exhausted or
+    stopped. The last message is the end of the scan or the raised error.
+    """
+
+    def put(message):
+        while not stop.is_set():
+            try:
+                batches.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    message = ("error", RuntimeError("Prefetch worker stopped"))
+    try:
+        scan = iter(scan)
+        while True:
+            batch = list(itertools.islice(scan, batchsize))
+            if not batch:
+                break
+            if not put(("batch", batch)):
+                return
+        message = ("end", None)
+    except BaseException as error:
+
+        # Errors cross to a consumer process only if picklable
+        if process:
+            try:
+                pickle.dumps(error)
+            except Exception:
+                error = RuntimeError(repr(error))
+        message = ("error", error)
+    finally:
+        put(message)
+
 
 class reflection(object):
     """Reflect coordinates about x and y axes
@@ -149,58 +1255,265 @@ class reflection(object):
     def __iter__(self):
         return self
 
+    def __length_hint__(self):
+        return _lengthhint(self.scan)
+
     def __next__(self):
         """Next point in iteration
         """
-        x, y = next(self.scan)
+        point = next(self.scan)
+        if _isbatch(point):
+            chunk = _batchbuffer(point)
+            xs, ys = chunk.xs, chunk.ys
+            return _rebatch(_pointbuffer([-x for x in xs] if self.rx else xs,
+                                         [-y for y in ys] if self.ry else ys),
+                            point)
+        if isinstance(point, Span):
+            if self.rx:
+                point = Span(point.y, -point.xstart, -point.xend,
+                             -point.direction)
+            return point._replace(y=-point.y) if self.ry else point
+        x, y = point
         xr = -x if self.rx else x
         yr = -y if self.ry else y
         return xr, yr
 
 
-class reservoir(object):
+class reorder(object):
+    """Reorder the points of a scan into a short path visiting each point,
+    e.g. to reduce the travel of a stage or beam driven by a sparse scan. The
+    whole scan is read into memory. The strategies are:
 
-    def __init__(self, scan, npoints):
-        """Randomly sample points using the reservoir sampling method. This is
-        only useful if you need exactly 'npoints' sampled. Otherwise use the
-        'sample' transformation to randomly sample at a given rate. This method
-        requires storing 'npoints' in memory and precomputing the random
-        selection so it may be slower than 'sample'.
+    - "nearest": greedy nearest neighbor path using a uniform grid index
+    - "hilbert-sort": sort the points along a Hilbert curve
+    - "2opt": nearest neighbor path improved by 2-opt moves between points
+      at most window positions apart
+
+    The path length of the points in scan order and after reordering are
+    available as the before and after attributes.
+    """
+
+    STRATEGIES = ("nearest", "hilbert-sort", "2opt")
 
+    def __init__(self, scan, strategy="nearest", metric=None, window=32):
+        """
         :param scan: Pixel scan generator
         :type scan: function
-        :param npoints: Sample size
-        :type npoints: int
+        :param strategy: Ordering strategy "nearest", "hilbert-sort" or
+                         "2opt" (default = "nearest")
+        :type strategy: str
+        :param metric: Travel distance metric that is never less than the
+                       chebyshev distance (default = None is euclidean)
+        :type metric: function
+        :param window: Maximum positions between 2-opt moves (default = 32)
+        :type window: int
         """
-        # Validate inputs
-        if npoints <= 0:
-            raise ValueError("Sample size must be positive")
+        if strategy not in self.STRATEGIES:
+            raise ValueError("Strategy must be 'nearest', 'hilbert-sort' or "
+                             "'2opt'")
+        if window < 2:
+            raise ValueError("Window must be at least 2")
+        if metric is None:
+            metric = euclidean
+
+        points = list(_flatten(scan))
+        if strategy == "hilbert-sort":
+            order = _hilbertorder(points)
+        else:
+            order = _nearestorder(points, metric)
+            if strategy == "2opt":
+                _twoopt(points, order, metric, window)
 
-        self.reservoir = []
+        self.before = _pathlength(points, metric)
+        self.points = [points[i] for i in order]
+        self.after = _pathlength(self.points, metric)
         self.count = 0
 
-        # Populate reservoir
-        for index, point in enumerate(scan):
-            if index < npoints:
-                self.reservoir.append(point)
-            else:
-                j = random.randint(0, index)
-                if j < npoints:
-                    self.reservoir[j] = point
-
-        # Shuffle the reservoir in case population was small and the
-        # points were not sufficiently randomized
-        random.shuffle(self.reservoir)
-
     def __iter__(self):
         return self
 
+    def __length_hint__(self):
+        return len(self.points) - self.count
+
     def __next__(self):
         """Next point in iteration
         """
-        if self.count < len(self.reservoir):
+        if self.count < len(self.points):
             self.count += 1
-            return self.reservoir[self.count-1]
+            return self.points[self.count-1]
+
+        raise StopIteration("Reorder exhausted")
+
+
+def _pathlength(points, metric):
+    """Length of the path through the points in order
+    """
+    return sum(map(metric, points, points[1:]))
+
+
+def _hilbertorder(points):
+    """Indices of the points sorted along a Hilbert curve over their bounding
+    box
+    """
+    if len(points) < 3:
+        return list(range(len(points)))
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    minx, miny = min(xs), min(ys)
+    span = max(max(xs) - minx, max(ys) - miny) or 1
+
+    # Curve cells at roughly four per point up to 2**16 per side
+    size = 1 << min(max((len(points) - 1).bit_length() // 2 + 1, 1), 16)
+    scale = (size - 1) / span
+    keys = [hilbertxy2d(size, int((x - minx) * scale), int((y - miny) * scale))
+            for x, y in zip(xs, ys)]
+    return sorted(range(len(points)), key=keys.__getitem__)
+
+
+def _nearestorder(points, metric):
+    """Indices of the points in a greedy nearest neighbor path starting from
+    the first point. Candidates are searched in rings of grid cells around
+    the current point until no unsearched cell can hold a closer point.
+    """
+    n = len(points)
+    if n < 3:
+        return list(range(n))
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    minx, miny = min(xs), min(ys)
+    width, height = max(xs) - minx, max(ys) - miny
+
+    # Cells sized for about one point each
+    cell = math.sqrt(width * height / n) or max(width, height) / n or 1
+    grid = {}
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        key = (int((x - minx) / cell), int((y - miny) / cell))
+        grid.setdefault(key, []).append(i)
+
+    def take(key, i):
+        indices = grid[key]
+        indices.remove(i)
+        if not indices:
+            del grid[key]
+
+    current = 0
+    take((int((xs[0] - minx) / cell), int((ys[0] - miny) / cell)), 0)
+    order = [0]
+    for remaining in range(n - 1, 0, -1):
+        point = points[current]
+        cx = int((xs[current] - minx) / cell)
+        cy = int((ys[current] - miny) / cell)
+        best, bestdistance, bestkey = None, float("inf"), None
+        r = 0
+        while True:
+
+            # Search all remaining points once rings outnumber them
+            if (2 * r + 1) ** 2 > 4 * remaining:
+                for key, indices in grid.items():
+                    for i in indices:
+                        distance = metric(point, points[i])
+                        if distance < bestdistance:
+                            best, bestdistance, bestkey = i, distance, key
+                break
+
+            for key in _cellring(cx, cy, r):
+                for i in grid.get(key, ()):
+                    distance = metric(point, points[i])
+                    if distance < bestdistance:
+                        best, bestdistance, bestkey = i, distance, key
+            if bestdistance <= r * cell:
+                break
+            r += 1
+
+        take(bestkey, best)
+        order.append(best)
+        current = best
+    return order
+
+
+def _cellring(cx, cy, r):
+    """Generate the grid cells at chebyshev distance r from a cell
+    """
+    if r == 0:
+        yield cx, cy
+        return
+    for x in range(cx - r, cx + r + 1):
+        yield x, cy - r
+        yield x, cy + r
+    for y in range(cy - r + 1, cy + r):
+        yield cx - r, y
+        yield cx + r, y
+
+
+def _twoopt(points, order, metric, window):
+    """Improve a path in place by reversing segments of at most window points
+    while that shortens it
+    """
+    n = len(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n - 2):
+            a, b = points[order[i]], points[order[i+1]]
+            ab = metric(a, b)
+            for j in range(i + 2, min(i + window, n)):
+                c = points[order[j]]
+                if j + 1 < n:
+                    d = points[order[j+1]]
+                    delta = metric(a, c) + metric(b, d) - ab - metric(c, d)
+                else:
+                    delta = metric(a, c) - ab
+                if delta < -1e-9:
+                    order[i+1:j+1] = order[j:i:-1]
+                    b = points[order[i+1]]
+                    ab = metric(a, b)
+                    improved = True
+
+
+class reservoir(object):
+
+    def __init__(self, scan, npoints):
+        """Randomly sample points using the reservoir sampling method. This is
+        only useful if you need exactly 'npoints' sampled. Otherwise use the
+        'sample' transformation to randomly sample at a given rate. This method
+        requires storing 'npoints' in memory and precomputing the random
+        selection so it may be slower than 'sample'.
+
+        :param scan: Pixel scan generator
+        :type scan: function
+        :param npoints: Sample size
+        :type npoints: int
+        """
+        # Validate inputs
+        if npoints <= 0:
+            raise ValueError("Sample size must be positive")
+
+        self.reservoir = []
+        self.count = 0
+
+        # Populate reservoir
+        for index, point in enumerate(scan):
+            if index < npoints:
+                self.reservoir.append(point)
+            else:
+                j = random.randint(0, index)
+                if j < npoints:
+                    self.reservoir[j] = point
+
+        # Shuffle the reservoir in case population was small and the
+        # points were not sufficiently randomized
+        random.shuffle(self.reservoir)
+
+    def __iter__(self):
+        return self
+
+    def __length_hint__(self):
+        return len(self.reservoir) - self.count
+
+    def __next__(self):
+        """Next point in iteration
+        """
+        if self.count < len(self.reservoir):
+            self.count += 1
+            return self.reservoir[self.count-1]
 
         raise StopIteration("Reservoir exhausted")
 
@@ -208,7 +1521,8 @@ class reservoir(object):
 class rotation(object):
     """Rotate coordinates by given angle. If the final transformation axes do
     not align with the x and y axes then it may yield duplicate coordinates
-    during scanning.
+    during scanning. Use rotatescan to scan a rotated rectangle with each
+    pixel visited exactly once.
     """
 
     def __init__(self, scan, angle=0):
@@ -224,11 +1538,22 @@ class rotation(object):
     def __iter__(self):
         return self
 
+    def __length_hint__(self):
+        return _lengthhint(self.scan)
+
     def __next__(self):
         """Next point in iteration
         """
-        x, y = next(self.scan)
+        point = next(self.scan)
         ca, sa = math.cos(self.angle), math.sin(self.angle)
+        if _isbatch(point):
+            xys = list(_batchbuffer(point))
+            return _rebatch(PointBuffer([ca * x - sa * y for x, y in xys],
+                                        [sa * x + ca * y for x, y in xys],
+                                        "d"), point)
+        if isinstance(point, Span):
+            raise TypeError("rotation does not support spans")
+        x, y = point
         xr = ca * x - sa * y
         yr = sa * x + ca * y
         return xr, yr
@@ -237,32 +1562,56 @@ class rotation(object):
 class sample(object):
     """Randomly sample points at the given probability.
     """
-    def __init__(self, scan, probability=1):
+    def __init__(self, scan, probability=1, seed=None):
         """
         :param scan: Pixel scan generator
         :type scan: function
         :param probability: Sampling probability in interval [0,1] (default=1)
         :type probability: float
+        :param seed: Seed of a private random number generator. If None then
+                     the global random module is used (default = None)
+        :type seed: int
         """
         if probability < 0 or probability > 1:
             raise ValueError("Sampling probability must be in range [0,1]")
         self.scan = scan
         self.probability = probability
+        self.rng = random if seed is None else random.Random(seed)
+
+    def __getstate__(self):
+        return _picklestate(self)
 
     def __iter__(self):
         return self
 
+    def __length_hint__(self):
+        # Expected number of sampled points
+        hint = _lengthhint(self.scan)
+        if hint is NotImplemented:
+            return hint
+        return int(math.ceil(hint * self.probability))
+
     def __next__(self):
         """Next point in iteration
         """
-        if self.probability == 1:
-            x, y = next(self.scan)
-        else:
-            while True:
-                x, y = next(self.scan)
-                if random.random() <= self.probability:
-                    break
-        return x, y
+        while True:
+            point = next(self.scan)
+            if isinstance(point, Span):
+                raise TypeError("sample does not support spans")
+            if self.probability == 1:
+                return point
+            if _isbatch(point):
+                # One draw per point as when sampling single points
+                chunk = _batchbuffer(point)
+                rand, probability = self.rng.random, self.probability
+                keep = [rand() <= probability for _ in range(len(chunk))]
+                if any(keep):
+                    return _rebatch(
+                        PointBuffer(itertools.compress(chunk.xs, keep),
+                                    itertools.compress(chunk.ys, keep),
+                                    chunk.xs.typecode), point)
+            elif self.rng.random() <= self.probability:
+                return point
 
 
 class scale(object):
@@ -289,15 +1638,97 @@ class scale(object):
     def __iter__(self):
         return self
 
+    def __length_hint__(self):
+        return _lengthhint(self.scan)
+
     def __next__(self):
         """Next point in iteration
         """
-        x, y = next(self.scan)
-        xr = self.sx * x
-        yr = self.sy * y
+        point = next(self.scan)
+        sx, sy = self.sx, self.sy
+        if _isbatch(point):
+            chunk = _batchbuffer(point)
+            return _rebatch(_pointbuffer([sx * x for x in chunk.xs],
+                                         [sy * y for y in chunk.ys]), point)
+        if isinstance(point, Span):
+            raise TypeError("scale does not support spans")
+        x, y = point
+        xr = sx * x
+        yr = sy * y
         return xr, yr
 
 
+class select(object):
+    """Randomly select exactly npoints distinct points of a scan that supports
+    random access. Unlike reservoir, the scan is not iterated. The point
+    indices are drawn directly and each point is looked up by its index, so
+    the cost is proportional to npoints rather than the scan length.
+    """
+
+    def __init__(self, scan, npoints, ordered=False, seed=None):
+        """
+        :param scan: Pixel scan generator with random access
+        :type scan: function
+        :param npoints: Sample size
+        :type npoints: int
+        :param ordered: True to yield the points in scan order, which
+                        preserves the locality of the scan (default = False)
+        :type ordered: bool
+        :param seed: Seed of a private random number generator. If None then
+                     the global random module is used (default = None)
+        :type seed: int
+        """
+        length = getattr(scan, "length", None)
+        if length is None:
+            raise TypeError("Scan does not support random access")
+
+        # Patterns without point(index) raise TypeError on first lookup
+        if length > 0:
+            scan.point(0)
+        if npoints < 0 or npoints > length:
+            raise ValueError("Sample size must be in range [0,length]")
+
+        self.scan = scan
+        self.rng = random if seed is None else random.Random(seed)
+        self.indices = self.choose(length, npoints)
+        if ordered:
+            self.indices.sort()
+        self.count = 0
+
+    def __getstate__(self):
+        return _picklestate(self)
+
+    def __iter__(self):
+        return self
+
+    def __length_hint__(self):
+        return len(self.indices) - self.count
+
+    def __next__(self):
+        """Next point in iteration
+        """
+        if self.count < len(self.indices):
+            self.count += 1
+            return self.scan[self.indices[self.count-1]]
+
+        raise StopIteration("Selection exhausted")
+
+    def choose(self, n, k):
+        """Draw k distinct indices in range [0,n) in random order. Dense
+        selections sample the index range directly while sparse selections
+        use Floyd's algorithm, which only stores the selected indices.
+        """
+        if 4 * k >= n:
+            return self.rng.sample(range(n), k)
+        selected = set()
+        for j in range(n - k, n):
+            index = self.rng.randint(0, j)
+            selected.add(j if index in selected else index)
+        indices = list(selected)
+        self.rng.shuffle(indices)
+        return indices
+
+
 class skip(object):
     """Skip points at the given step size
     """
@@ -329,11 +1760,37 @@ class skip(object):
     def __iter__(self):
         return self
 
+    def __length_hint__(self):
+
+        # Range of upstream indices left to consume
+        hint = _lengthhint(self.scan)
+        if hint is NotImplemented:
+            if self.stop == sys.maxsize:
+                return hint
+            last = self.stop
+        else:
+            last = min(self.index + hint, self.stop)
+
+        # First index at or after the next one that is on a step
+        first = max(self.index + 1, self.start)
+        first += -(first - self.start) % self.step
+        if first > last:
+            return 0
+        return (last - first) // self.step + 1
+
     def __next__(self):
         """Next point in iteration
         """
         while True:
-            x, y = next(self.scan)
+            point = next(self.scan)
+            if _isbatch(point):
+                chunk = self.skipchunk(_batchbuffer(point))
+                if len(chunk) > 0:
+                    return _rebatch(chunk, point)
+                continue
+            if isinstance(point, Span):
+                raise TypeError("skip does not support spans")
+            x, y = point
             self.index += 1
             if (self.index < self.start):
                 continue
@@ -343,6 +1800,25 @@ class skip(object):
                 continue
             return x, y
 
+    def skipchunk(self, chunk):
+        """Slice the points of a chunk that are on a step. The chunk points
+        are counted individually by the iteration index.
+        """
+        first = self.index + 1
+        if first > self.stop:
+            raise StopIteration("skip stopping")
+        self.index += len(chunk)
+
+        # Chunk offsets of the first and last points to keep
+        begin = max(first, self.start)
+        begin += -(begin - self.start) % self.step
+        end = min(self.index, self.stop) + 1
+        if begin >= end:
+            return PointBuffer()
+        begin, end = begin - first, end - first
+        return PointBuffer(chunk.xs[begin:end:self.step],
+                           chunk.ys[begin:end:self.step])
+
 
 class snap(object):
     """Snap x and y coordinates to a grid point
@@ -357,10 +1833,23 @@ class snap(object):
     def __iter__(self):
         return self
 
+    def __length_hint__(self):
+        return _lengthhint(self.scan)
+
     def __next__(self):
         """Next point in iteration
         """
-        x, y = next(self.scan)
+        point = next(self.scan)
+        if _isbatch(point):
+            chunk = _batchbuffer(point)
+            if chunk.xs.typecode not in "fd":
+                return point
+            return _rebatch(PointBuffer([int(round(x)) for x in chunk.xs],
+                                        [int(round(y)) for y in chunk.ys]),
+                            point)
+        if isinstance(point, Span):
+            raise TypeError("snap does not support spans")
+        x, y = point
         xs = int(round(x))
         ys = int(round(y))
         return xs, ys
@@ -379,10 +1868,19 @@ class swap(object):
     def __iter__(self):
         return self
 
+    def __length_hint__(self):
+        return _lengthhint(self.scan)
+
     def __next__(self):
         """Next point in iteration
         """
-        x, y = next(self.scan)
+        point = next(self.scan)
+        if _isbatch(point):
+            chunk = _batchbuffer(point)
+            return _rebatch(PointBuffer(chunk.ys, chunk.xs), point)
+        if isinstance(point, Span):
+            raise TypeError("swap does not support spans")
+        x, y = point
         return y, x
 
 
@@ -406,336 +1904,3028 @@ class translation(object):
     def __iter__(self):
         return self
 
+    def __length_hint__(self):
+        return _lengthhint(self.scan)
+
     def __next__(self):
         """Next point in iteration
         """
-        x, y = next(self.scan)
-        xr = x + self.tx
-        yr = y + self.ty
+        point = next(self.scan)
+        tx, ty = self.tx, self.ty
+        if _isbatch(point):
+            chunk = _batchbuffer(point)
+            return _rebatch(_pointbuffer([x + tx for x in chunk.xs],
+                                         [y + ty for y in chunk.ys]), point)
+        if isinstance(point, Span):
+            return Span(point.y + ty, point.xstart + tx, point.xend + tx,
+                        point.direction)
+        x, y = point
+        xr = x + tx
+        yr = y + ty
         return xr, yr
 
+
+class unique(object):
+    """Drop points that were already visited. Visited pixels inside the given
+    bounds are tracked with one bit per pixel (see PixelSet) and all other
+    pixels with a hashed set.
+    """
+
+    def __init__(self, scan, minx=None, maxx=None, miny=None, maxy=None):
+        """
+        :param scan: Pixel scan generator
+        :type scan: function
+        :param minx: Minimum x-coordinate of bitset (default = None)
+        :type minx: int
+        :param maxx: Maximum x-coordinate of bitset (default = None)
+        :type maxx: int
+        :param miny: Minimum y-coordinate of bitset (default = None)
+        :type miny: int
+        :param maxy: Maximum y-coordinate of bitset (default = None)
+        :type maxy: int
+        """
+        self.scan = scan
+        self.visited = PixelSet(minx, maxx, miny, maxy)
+        self.total = 0
+
+    def __iter__(self):
+        return self
+
+    def __length_hint__(self):
+        # Upper bound since points may be duplicates
+        return _lengthhint(self.scan)
+
+    def __next__(self):
+        """Next point in iteration
+        """
+        add = self.visited.add
+        while True:
+            point = next(self.scan)
+            if _isbatch(point):
+                chunk = _batchbuffer(point)
+                self.total += len(chunk)
+                keep = list(map(add, chunk.xs, chunk.ys))
+                if any(keep):
+                    return _rebatch(
+                        PointBuffer(itertools.compress(chunk.xs, keep),
+                                    itertools.compress(chunk.ys, keep),
+                                    chunk.xs.typecode), point)
+                continue
+            if isinstance(point, Span):
+                raise TypeError("unique does not support spans")
+            self.total += 1
+            x, y = point
+            if add(x, y):
+                return x, y
+
+    @property
+    def count(self):
+        """Number of unique points visited so far
+        """
+        return len(self.visited)
+
+    @property
+    def coverage(self):
+        """Ratio of unique points to all points visited so far
+        """
+        return self.count / self.total if self.total > 0 else 0.0
+
 # ======================================================================
 # Scan patterns
 # ----------------------------------------------------------------------
 
 
-def circlescan(x0, y0, r1, r2):
-    """Scan pixels in a circle pattern around a center point
+class _ScanPattern(object):
+    """Base class of scan patterns. Patterns are iterators over their points
+    that keep track of the 0-based index of the next point. Subclasses
+    implement generate(start), which returns an iterator over the points
+    starting at point index start, and set length to the total number of
+    points when it is known.
 
-    :param x0: Center x-coordinate
-    :type x0: float
-    :param y0: Center y-coordinate
-    :type y0: float
-    :param r1: Initial radius
-    :type r1: float
-    :param r2: Final radius
-    :type r2: float
-    :returns: Coordinate generator
-    :rtype: function
+    Patterns can be pickled at any point of the scan to checkpoint it. The
+    pickled state holds the pattern parameters, the scan position and the
+    random number generator state, and unpickling resumes the scan at the
+    same point without replaying it. Subclasses whose generate(start) has to
+    replay the scan override resume() to restart from their saved position.
     """
 
-    # Validate inputs
-    if r1 < 0:
-        raise ValueError("Initial radius must be non-negative")
-    if r2 < 0:
-        raise ValueError("Final radius must be non-negative")
+    chunksize = None
+    length = None
 
-    # List of pixels visited in previous diameter
-    previous = []
+    def __getstate__(self):
+        state = _picklestate(self)
+        del state["points"]
+        return state
 
-    # Scan distances outward (1) or inward (-1)
-    rstep = 1 if r2 >= r1 else -1
-    for distance in range(r1, r2 + rstep, rstep):
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.points = self.resume()
 
-        if distance == 0:
+    def __getitem__(self, index):
+        """Point at the given 0-based index of the scan. This does not change
+        the iteration position.
+        """
+        if self.length is None:
+            raise TypeError("Scan length is unknown")
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("Scan index out of range")
+        return self.point(index)
 
-            yield x0, y0
+    def __iter__(self):
+        return self
 
-        else:
+    def __next__(self):
+        """Next point in iteration
+        """
+        point = next(self.points)
+        self.index += len(point) if self.chunksize else 1
+        return point
+
+    def __length_hint__(self):
+        remaining = self.remaining()
+        if remaining is None:
+            return NotImplemented
+        if self.chunksize:
+            return -(-remaining // self.chunksize)
+        return remaining
+
+    def index_of(self, x, y):
+        """0-based index of a point in the scan computed without iterating.
+        Subclasses that support inverse lookup override this.
+
+        :param x: x-coordinate
+        :type x: int
+        :param y: y-coordinate
+        :type y: int
+        :returns: Point index
+        :rtype: int
+        """
+        raise TypeError("Scan does not support inverse lookup")
 
-            # Computes points for first octant and the rotate by multiples of
-            # 45 degrees to compute the other octants
-            a = 0.707107
-            rotations = {0: [[1, 0], [0, 1]],
-                         1: [[a, a], [-a, a]],
-                         2: [[0, 1], [-1, 0]],
-                         3: [[-a, a], [-a, -a]],
-                         4: [[-1, 0], [0, -1]],
-                         5: [[-a, -a], [a, -a]],
-                         6: [[0, -1], [1, 0]],
-                         7: [[a, -a], [a, a]]}
-            nangles = len(rotations)
-
-            # List of pixels visited in current diameter
-            current = []
-
-            for angle in range(nangles):
-                x = 0
-                y = distance
-                d = 1 - distance
-                while x < y:
-                    xr = rotations[angle][0][0]*x + rotations[angle][0][1]*y
-                    yr = rotations[angle][1][0]*x + rotations[angle][1][1]*y
-                    xr = x0 + xr
-                    yr = y0 + yr
-
-                    # First check  if point was in previous diameter
-                    # since our scan pattern can lead to duplicates in
-                    # neighboring diameters
-                    point = (int(round(xr)), int(round(yr)))
-                    if point not in previous:
-                        yield xr, yr
-                        current.append(point)
-
-                    # Move pixel according to circle constraint
-                    if (d < 0):
-                        d += 3 + 2 * x
-                    else:
-                        d += 5 - 2 * (y-x)
-                        y -= 1
-                    x += 1
+    def indices_of(self, xs, ys):
+        """0-based indices of the points of coordinate arrays in the scan
+
+        :param xs: x-coordinates
+        :type xs: sequence
+        :param ys: y-coordinates
+        :type ys: sequence
+        :returns: Point indices
+        :rtype: array.array
+        """
+        return array.array("q", map(self.index_of, xs, ys))
 
-            previous = current
+    def spans(self):
+        """Generate the scan as Span runs of consecutive points on a row.
+        This does not change the iteration position. Subclasses that
+        generate whole rows override this.
 
+        :returns: Spans iterator
+        :rtype: iterator
+        """
+        return _pointspans(_flatten(self.generate(0)))
 
-def gridscan(xi, yi, xf, yf, stepx=1, stepy=1):
-    """Scan pixels in a grid pattern along the x-coordinate then y-coordinate
+    def point(self, index):
+        """Point at the given 0-based index of the scan. Subclasses that
+        support random access override this.
 
-    :param xi: Initial x-coordinate
-    :type xi: int
-    :param yi: Initial y-coordinate
-    :type yi: int
-    :param xf: Final x-coordinate
-    :type xf: int
-    :param yf: Final y-coordinate
-    :type yf: int
-    :param stepx: Step size in x-coordinate
-    :type stepx: int
-    :param stepy: Step size in y-coordinate
-    :type stepy: int
-    :returns: Coordinate generator
-    :rtype: function
-    """
-
-    if stepx <= 0:
-        raise ValueError("X-step must be positive")
-    if stepy <= 0:
-        raise ValueError("Y-step must be positive")
-
-    # Determine direction to move
-    dx = stepx if xf >= xi else -stepx
-    dy = stepy if yf >= yi else -stepy
-
-    for y in range(yi, yf + dy, dy):
-        for x in range(xi, xf + dx, dx):
-            yield x, y
+        :param index: Point index
+        :type index: int
+        :returns: Point coordinates
+        :rtype: tuple
+        """
+        raise TypeError("Scan does not support random access")
 
+    def remaining(self):
+        """Number of points left to scan. This is an estimate if the exact
+        number is unknown and None if the scan is unbounded.
 
-def hilbertscan(size, distance):
-    """Scan pixels in a Hilbert curve pattern in the first quadrant. Modified
-    algorithm from https://en.wikipedia.org/wiki/Hilbert_curve.
+        :returns: Number of points
+        :rtype: int
+        """
+        if self.length is None:
+            return None
+        return max(self.length - self.index, 0)
 
-    :param size: Size of enclosing square
-    :type size: int
-    :param distance: Distance along curve (Must be smaller than  size**2 - 1)
-    :type distance: int
-    :returns: Coordinate generator
-    :rtype: function
-    """
-
-    size = 2 * (1 << (size-1).bit_length())
-    if (distance > size**2 - 1):
-        raise StopIteration("Invalid distance!")
-
-    for d in range(distance):
-        t = d
-        x = 0
-        y = 0
-        s = 1
-        while (s < size):
-            rx = float_and(1, t / 2)
-            ry = float_and(1, float_xor(t, rx))
-            x, y = hilbertrot(s, x, y, rx, ry)
-            x += s * rx
-            y += s * ry
-            t /= 4
-            s *= 2
-        yield x, y
-
-
-def ringscan(x0, y0, r1, r2, metric=chebyshev):
-    """Scan pixels in a ring pattern around a center point clockwise
+    def seek(self, index):
+        """Restart the scan at the given 0-based point index
+
+        :param index: Point index
+        :type index: int
+        """
+        if index < 0:
+            raise ValueError("Index must be non-negative")
+        self.index = index
+        self.points = self.generate(index)
 
-    :param x0: Center x-coordinate
-    :type x0: int
-    :param y0: Center y-coordinate
-    :type y0: int
-    :param r1: Initial radius
-    :type r1: int
-    :param r2: Final radius
-    :type r2: int
-    :param metric: Distance metric
-    :type metric: function
-    :returns: Coordinate generator
-    :rtype: function
-    """
-
-    # Validate inputs
-    if r1 < 0:
-        raise ValueError("Initial radius must be non-negative")
-    if r2 < 0:
-        raise ValueError("Final radius must be non-negative")
-    if not hasattr(metric, "__call__"):
-        raise TypeError("Metric not callable")
-
-    # Define clockwise step directions
-    direction = 0
-    steps = {0: [1, 0],
-             1: [1, -1],
-             2: [0, -1],
-             3: [-1, -1],
-             4: [-1, 0],
-             5: [-1, 1],
-             6: [0, 1],
-             7: [1, 1]}
-    nsteps = len(steps)
-
-    center = [x0, y0]
-
-    # Scan distances outward (1) or inward (-1)
-    rstep = 1 if r2 >= r1 else -1
-    for distance in range(r1, r2 + rstep, rstep):
-
-        initial = [x0, y0 + distance]
-        current = initial
-
-        # Number of tries to find a valid neighrbor
-        ntrys = 0
+    def resume(self):
+        """Iterator over the points from the current index. This is called to
+        resume an unpickled scan.
 
-        while True:
+        :returns: Points iterator
+        :rtype: iterator
+        """
+        return self.generate(self.index)
+
+
+def _spanpoints(spans, start=0, chunksize=None):
+    """Generate the points of inclusive (y, xstart, xend) row spans, which
+    may run in either x direction, skipping the first start points. If
+    chunksize is given then the points are yielded as PointBuffer chunks.
+    """
+    chunk = PointBuffer()
+    for y, xa, xb in spans:
+        dx = 1 if xb >= xa else -1
+        xs = range(xa, xb + dx, dx)
+        if start > 0:
+            if start >= len(xs):
+                start -= len(xs)
+                continue
+            xs, start = xs[start:], 0
+
+        if chunksize is None:
+            for x in xs:
+                yield x, y
+            continue
+
+        # Fill chunks a span at a time splitting spans that straddle chunks
+        while xs:
+            n = min(len(xs), chunksize - len(chunk))
+            chunk.xs.extend(xs[:n])
+            chunk.ys.extend(itertools.repeat(y, n))
+            xs = xs[n:]
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = PointBuffer()
+    if chunksize is not None and len(chunk) > 0:
+        yield chunk
+
+
+def _pointspans(points):
+    """Group consecutive points that step by 1 or -1 along a row into spans
+    """
+    span = None
+    for x, y in points:
+        if span is not None:
+            sy, xa, xb, direction = span
+            if y == sy and (x - xb == direction or
+                            (xa == xb and x - xb == -1)):
+                span = (sy, xa, x, x - xb)
+                continue
+            yield Span(*span)
+        span = (y, x, x, 1)
+    if span is not None:
+        yield Span(*span)
+
+
+def _runspans(runs):
+    """Convert inclusive (y, xstart, xend) runs to spans
+    """
+    for y, xa, xb in runs:
+        yield Span(y, xa, xb, 1 if xb >= xa else -1)
+
+
+def _chunkpoints(points, chunksize):
+    """Group an iterator of 2D or 3D points into PointBuffer or PointBuffer3D
+    chunks
+    """
+    while True:
+        chunk = list(itertools.islice(points, chunksize))
+        if not chunk:
+            return
+        yield _pointbuffer(*zip(*chunk))
+
+
+class circlescan(_ScanPattern):
+    """Scan pixels in a circle pattern around a center point
+    """
+
+    def __init__(self, x0, y0, r1, r2):
+        """
+        :param x0: Center x-coordinate
+        :type x0: float
+        :param y0: Center y-coordinate
+        :type y0: float
+        :param r1: Initial radius
+        :type r1: float
+        :param r2: Final radius
+        :type r2: float
+        """
+
+        # Validate inputs
+        if r1 < 0:
+            raise ValueError("Initial radius must be non-negative")
+        if r2 < 0:
+            raise ValueError("Final radius must be non-negative")
+
+        self.x0 = x0
+        self.y0 = y0
+        self.r1 = r1
+        self.r2 = r2
+
+        # Scan distances outward (1) or inward (-1)
+        rstep = 1 if r2 >= r1 else -1
+        self.distances = range(r1, r2 + rstep, rstep)
+
+        # Each octant of a circle has about distance / sqrt(2) points
+        self.estimate = sum(8 * int(math.ceil(distance / math.sqrt(2))) or 1
+                            for distance in self.distances)
+        self.ring, self.previous, self.ringstart = 0, [], 0
+        self.seek(0)
+
+    def generate(self, start):
+        return self.circle(0, [], 0, start)
+
+    def resume(self):
+
+        # The saved ring may be past the index after seeking back
+        if self.ringstart > self.index:
+            return self.generate(self.index)
+        return self.circle(self.ring, self.previous, self.ringstart,
+                           self.index)
+
+    def circle(self, ring, previous, count, start):
+        """Generate the points of the scan starting at the given ring index.
+        The previous ring pixels and the number of points before the ring
+        are needed to resume the scan. Points before index start are skipped.
+        """
+        x0, y0 = self.x0, self.y0
+
+        for ring in range(ring, len(self.distances)):
+            distance = self.distances[ring]
+
+            # Save ring position to checkpoint the scan
+            self.ring, self.previous, self.ringstart = ring, previous, count
 
-            # Short-circuit special case
             if distance == 0:
-                yield current[0], current[1]
-                break
 
-            # Try and take a step and check if still within distance
-            nextpoint = [current[i] + steps[direction][i] for i in range(2)]
-            if metric(center, nextpoint) != distance:
+                if count >= start:
+                    yield x0, y0
+                count += 1
 
-                # Check if we tried all step directions and failed
-                ntrys += 1
-                if ntrys == nsteps:
-                    break
+            else:
+
+                # Computes points for first octant and the rotate by multiples
+                # of 45 degrees to compute the other octants
+                a = 0.707107
+                rotations = {0: [[1, 0], [0, 1]],
+                             1: [[a, a], [-a, a]],
+                             2: [[0, 1], [-1, 0]],
+                             3: [[-a, a], [-a, -a]],
+                             4: [[-1, 0], [0, -1]],
+                             5: [[-a, -a], [a, -a]],
+                             6: [[0, -1], [1, 0]],
+                             7: [[a, -a], [a, a]]}
+                nangles = len(rotations)
+
+                # List of pixels visited in current diameter
+                current = []
+
+                for angle in range(nangles):
+                    x = 0
+                    y = distance
+                    d = 1 - distance
+                    while x < y:
+                        xr = (rotations[angle][0][0]*x +
+                              rotations[angle][0][1]*y)
+                        yr = (rotations[angle][1][0]*x +
+                              rotations[angle][1][1]*y)
+                        xr = x0 + xr
+                        yr = y0 + yr
+
+                        # First check  if point was in previous diameter
+                        # since our scan pattern can lead to duplicates in
+                        # neighboring diameters
+                        point = (int(round(xr)), int(round(yr)))
+                        if point not in previous:
+                            if count >= start:
+                                yield xr, yr
+                            count += 1
+                            current.append(point)
+
+                        # Move pixel according to circle constraint
+                        if (d < 0):
+                            d += 3 + 2 * x
+                        else:
+                            d += 5 - 2 * (y-x)
+                            y -= 1
+                        x += 1
+
+                previous = current
+
+    def remaining(self):
+        return max(self.estimate - self.index, 0)
+
+
+class gridscan(_ScanPattern):
+    """Scan pixels in a grid pattern along the x-coordinate then y-coordinate
+    """
+
+    def __init__(self, xi, yi, xf, yf, stepx=1, stepy=1):
+        """
+        :param xi: Initial x-coordinate
+        :type xi: int
+        :param yi: Initial y-coordinate
+        :type yi: int
+        :param xf: Final x-coordinate
+        :type xf: int
+        :param yf: Final y-coordinate
+        :type yf: int
+        :param stepx: Step size in x-coordinate
+        :type stepx: int
+        :param stepy: Step size in y-coordinate
+        :type stepy: int
+        """
+
+        if stepx <= 0:
+            raise ValueError("X-step must be positive")
+        if stepy <= 0:
+            raise ValueError("Y-step must be positive")
+
+        # Determine direction to move
+        dx = stepx if xf >= xi else -stepx
+        dy = stepy if yf >= yi else -stepy
+
+        self.xs = range(xi, xf + dx, dx)
+        self.ys = range(yi, yf + dy, dy)
+        self.length = len(self.xs) * len(self.ys)
+        self.seek(0)
+
+    def generate(self, start):
+        xs = self.xs
+        row, column = divmod(start, len(xs))
+        for y in self.ys[row:]:
+            for x in xs[column:]:
+                yield x, y
+            column = 0
+
+    def index_of(self, x, y):
+        if x not in self.xs or y not in self.ys:
+            raise ValueError("Point not in scan")
+        return self.ys.index(y) * len(self.xs) + self.xs.index(x)
+
+    def point(self, index):
+        row, column = divmod(index, len(self.xs))
+        return self.xs[column], self.ys[row]
+
+    def spans(self):
+        xs = self.xs
+        if abs(xs.step) != 1:
+            return super().spans()
+        return (Span(y, xs[0], xs[-1], xs.step) for y in self.ys)
+
+    def indices_of(self, xs, ys):
+        # Ranges look up indices arithmetically so map them directly
+        xindex, yindex, nx = self.xs.index, self.ys.index, len(self.xs)
+        try:
+            return array.array("q", [yindex(y) * nx + xindex(x)
+                                     for x, y in zip(xs, ys)])
+        except ValueError:
+            raise ValueError("Point not in scan")
+
+
+class floodscan(_ScanPattern):
+    """Scan the connected region of pixels containing a seed pixel. The
+    region is given by a function of the coordinates or a mask. The scanline
+    order fills the region a horizontal span at a time and tracks visited
+    pixels in a bitset (see PixelSet) when bounds are known. The breadth
+    first order visits the region in increasing number of steps from the seed
+    (rings of increasing radius if unobstructed) and only stores the visited
+    pixels of the current, previous and next rings.
+    """
+
+    def __init__(self, x0, y0, inside, connectivity=4, order="scanline",
+                 minx=None, maxx=None, miny=None, maxy=None, chunksize=None):
+        """
+        :param x0: Seed x-coordinate
+        :type x0: int
+        :param y0: Seed y-coordinate
+        :type y0: int
+        :param inside: Function that takes 2 arguments (x and y) and returns
+                       true if the pixel is in the region, or mask indexed as
+                       mask[y][x]
+        :type inside: function
+        :param connectivity: Pixel neighbors 4 or 8 (default = 4)
+        :type connectivity: int
+        :param order: Scan order "scanline" or "bfs" (default = "scanline")
+        :type order: str
+        :param minx: Minimum x-coordinate of region (default = None)
+        :type minx: int
+        :param maxx: Maximum x-coordinate of region (default = None)
+        :type maxx: int
+        :param miny: Minimum y-coordinate of region (default = None)
+        :type miny: int
+        :param maxy: Maximum y-coordinate of region (default = None)
+        :type maxy: int
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
 
-                # Try the next direction
-                direction = (direction + 1) % nsteps
+        # Validate inputs
+        if connectivity not in (4, 8):
+            raise ValueError("Connectivity must be 4 or 8")
+        if order not in ("scanline", "bfs"):
+            raise ValueError("Order must be 'scanline' or 'bfs'")
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        # Masks bound the region unless bounds are given
+        bounds = (minx, maxx, miny, maxy)
+        self.mask = None
+        self.predicate = inside
+        if not hasattr(inside, "__call__"):
+            self.mask = inside
+            self.predicate = None
+            if bounds == (None, None, None, None):
+                width = max([len(row) for row in inside] or [0])
+                bounds = (0, width - 1, 0, len(inside) - 1)
+        if None in bounds and any(bound is not None for bound in bounds):
+            raise ValueError("Bounds must be all set or all None")
+
+        self.x0 = x0
+        self.y0 = y0
+        self.connectivity = connectivity
+        self.order = order
+        self.bounds = bounds
+        self.chunksize = chunksize
+        self.seek(0)
+
+    def contains(self, x, y):
+        """True if the pixel is in the region
+        """
+        minx, maxx, miny, maxy = self.bounds
+        if minx is not None and not (minx <= x <= maxx and
+                                     miny <= y <= maxy):
+            return False
+        if self.mask is None:
+            return bool(self.predicate(x, y))
+        if y < 0 or x < 0:
+            return False
+        try:
+            return bool(self.mask[y][x])
+        except IndexError:
+            return False
+
+    def generate(self, start):
+        if self.order == "scanline":
+            return _spanpoints(self.scanline(), start, self.chunksize)
+        points = itertools.islice(self.rings(), start, None)
+        if self.chunksize is not None:
+            points = _chunkpoints(points, self.chunksize)
+        return points
+
+    def spans(self):
+        if self.order == "scanline":
+            return _runspans(self.scanline())
+        return super().spans()
+
+    def rings(self):
+        """Generate the region points breadth first from the seed
+        """
+        contains = self.contains
+        if not contains(self.x0, self.y0):
+            return
+        steps = ([(1, 0), (0, -1), (-1, 0), (0, 1)]
+                 if self.connectivity == 4 else
+                 [(1, 0), (1, -1), (0, -1), (-1, -1),
+                  (-1, 0), (-1, 1), (0, 1), (1, 1)])
+
+        # Neighbors of a ring can only be in the previous, same or next ring
+        previous, current = set(), [(self.x0, self.y0)]
+        while current:
+            for point in current:
+                yield point
+            ring = set(current)
+            following, nextring = [], set()
+            for x, y in current:
+                for dx, dy in steps:
+                    point = (x + dx, y + dy)
+                    if (point in nextring or point in ring or
+                            point in previous):
+                        continue
+                    if contains(*point):
+                        nextring.add(point)
+                        following.append(point)
+            previous, current = ring, following
+
+    def scanline(self):
+        """Generate the (y, xstart, xend) runs of the region with a scanline
+        fill from the seed
+        """
+        contains = self.contains
+        visited = PixelSet(*self.bounds)
+        extra = 1 if self.connectivity == 8 else 0
+        stack = [(self.x0, self.y0)]
+        while stack:
+            x, y = stack.pop()
+            if (x, y) in visited or not contains(x, y):
                 continue
 
-            ntrys = 0
-            yield current[0], current[1]
+            # Extend the span to the left and right of the seed pixel
+            xa = x
+            while contains(xa - 1, y):
+                xa -= 1
+            xb = x
+            while contains(xb + 1, y):
+                xb += 1
+            for x in range(xa, xb + 1):
+                visited.add(x, y)
+            yield y, xa, xb
+
+            # Push one seed for each unvisited run of the adjacent rows
+            for yn in (y + 1, y - 1):
+                x, end = xa - extra, xb + extra
+                while x <= end:
+                    if (x, yn) not in visited and contains(x, yn):
+                        stack.append((x, yn))
+                        while x < end and contains(x + 1, yn):
+                            x += 1
+                    x += 1
 
-            # Check if we have come all the way around
-            current = nextpoint
-            if current == initial:
-                break
 
-        # Check if we tried all step directions and failed
-        if ntrys == nsteps:
-            break
+class gilbertscan(_ScanPattern):
+    """Scan pixels of a width x height rectangle in the first quadrant in a
+    generalized Hilbert ("gilbert") curve pattern. Every pixel is visited
+    exactly once without padding the rectangle to a power of two. Modified
+    algorithm from https://github.com/jakubcerveny/gilbert.
+    """
 
+    def __init__(self, width, height, chunksize=None):
+        """
+        :param width: Rectangle width
+        :type width: int
+        :param height: Rectangle height
+        :type height: int
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
 
-def snakescan(xi, yi, xf, yf):
-    """Scan pixels in a snake pattern along the x-coordinate then y-coordinate
+        # Validate inputs
+        if width < 1 or height < 1:
+            raise ValueError("Width and height must be positive")
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        self.width = width
+        self.height = height
+        self.chunksize = chunksize
+        self.length = width * height
+        self.seek(0)
+
+    def generate(self, start):
+        points = self.curve(start)
+        if self.chunksize is not None:
+            points = _chunkpoints(points, self.chunksize)
+        return points
+
+    def curve(self, start):
+        """Generate the curve points skipping the first start points
+        """
+        stack = [self.root()]
+        while stack:
+            x, y, ax, ay, bx, by = stack.pop()
+            area = abs(ax + ay) * abs(bx + by)
+            if start >= area:
+                start -= area
+                continue
+            parts = _gilbertsplit(x, y, ax, ay, bx, by)
+            if parts is None:
+                dx, dy = _gilbertstep(ax, ay, bx, by)
+                for i in range(start, area):
+                    yield x + i * dx, y + i * dy
+                start = 0
+                continue
+            stack.extend(reversed(parts))
 
-    :param xi: Initial x-coordinate
-    :type xi: int
-    :param yi: Initial y-coordinate
-    :type yi: int
-    :param xf: Final x-coordinate
-    :type xf: int
-    :param yf: Final y-coordinate
-    :type yf: int
-    :returns: Coordinate generator
-    :rtype: function
-    """
-
-    # Determine direction to move
-    dx = 1 if xf >= xi else -1
-    dy = 1 if yf >= yi else -1
-
-    # Scan pixels first along x-coordinate then y-coordinate and flip
-    # x-direction when the end of the line is reached
-    x, xa, xb = xi, xi, xf
-    for y in range(yi, yf + dy, dy):
-        for x in range(xa, xb + dx, dx):
-            yield x, y
+    def point(self, index):
+        x, y, ax, ay, bx, by = self.root()
+        while True:
+            parts = _gilbertsplit(x, y, ax, ay, bx, by)
+            if parts is None:
+                dx, dy = _gilbertstep(ax, ay, bx, by)
+                return x + index * dx, y + index * dy
+            for x, y, ax, ay, bx, by in parts:
+                area = abs(ax + ay) * abs(bx + by)
+                if index < area:
+                    break
+                index -= area
+
+    def root(self):
+        """Rectangle of the whole curve as its corner, major axis and minor
+        axis vectors
+        """
+        if self.width >= self.height:
+            return 0, 0, self.width, 0, 0, self.height
+        return 0, 0, 0, self.height, self.width, 0
 
-        # Swap x-direction
-        if x == xa or x == xb:
-            dx *= -1
-            xa, xb = xb, xa
 
+def _gilbertstep(ax, ay, bx, by):
+    """Unit step along a gilbert curve rectangle that is a single row or
+    column
+    """
+    if abs(bx + by) == 1:
+        return (ax > 0) - (ax < 0), (ay > 0) - (ay < 0)
+    return (bx > 0) - (bx < 0), (by > 0) - (by < 0)
 
-def walkscan(x0, y0, xn=0.25, xp=0.25, yn=0.25, yp=0.25):
-    """Scan pixels in a random walk pattern with given step probabilities. The
-    random walk will continue indefinitely unless a skip transformation is used
-    with the 'stop' parameter set or a clip transformation is used with the
-    'abort' parameter set to True. The probabilities are normalized to one.
 
-    :param x0: Initial x-coordinate
-    :type x0: int
-    :param y0: Initial y-coordinate
-    :type y0: int
-    :param xn: Probability of moving in the negative x direction
-    :type xn: float
-    :param xp: Probability of moving in the positive x direction
-    :type xp: float
-    :param yn: Probability of moving in the negative y direction
-    :type yn: float
-    :param yp: Probability of moving in the positive y direction
-    :type yp: float
-    """
-
-    # Validate inputs
-    if xn < 0:
-        raise ValueError("Negative x probabilty must be non-negative")
-    if xp < 0:
-        raise ValueError("Positive x probabilty must be non-negative")
-    if yn < 0:
-        raise ValueError("Negative y probabilty must be non-negative")
-    if yp < 0:
-        raise ValueError("Positive y probabilty must be non-negative")
-
-    # Compute normalized probability
-    total = xp + xn + yp + yn
-    xn /= total
-    xp /= total
-    yn /= total
-    yp /= total
-
-    # Compute cumulative probability
-    cxn = xn
-    cxp = cxn + xp
-    cyn = cxp + yn
-
-    # Initialize position
-    x, y = x0, y0
+def _gilbertsplit(x, y, ax, ay, bx, by):
+    """Split a gilbert curve rectangle into its sub-rectangles in curve order,
+    or return None if it is a single row or column.
+    """
+    w = abs(ax + ay)
+    h = abs(bx + by)
+    if w == 1 or h == 1:
+        return None
+
+    dax, day = (ax > 0) - (ax < 0), (ay > 0) - (ay < 0)
+    dbx, dby = (bx > 0) - (bx < 0), (by > 0) - (by < 0)
+    ax2, ay2 = ax // 2, ay // 2
+    bx2, by2 = bx // 2, by // 2
+    w2 = abs(ax2 + ay2)
+    h2 = abs(bx2 + by2)
+
+    # Long rectangles are split in two along the major axis
+    if 2 * w > 3 * h:
+        if w2 % 2 and w > 2:
+            ax2, ay2 = ax2 + dax, ay2 + day
+        return [(x, y, ax2, ay2, bx, by),
+                (x + ax2, y + ay2, ax - ax2, ay - ay2, bx, by)]
+
+    # Otherwise split in three going up, across and back down
+    if h2 % 2 and h > 2:
+        bx2, by2 = bx2 + dbx, by2 + dby
+    return [(x, y, bx2, by2, ax2, ay2),
+            (x + bx2, y + by2, ax, ay, bx - bx2, by - by2),
+            (x + (ax - dax) + (bx2 - dbx), y + (ay - day) + (by2 - dby),
+             -bx2, -by2, -(ax - ax2), -(ay - ay2))]
+
+
+class hilbertscan(_ScanPattern):
+    """Scan pixels in a Hilbert curve pattern in the first quadrant. Modified
+    algorithm from https://en.wikipedia.org/wiki/Hilbert_curve.
+    """
 
-    while True:
+    def __init__(self, size, distance):
+        """
+        :param size: Size of enclosing square
+        :type size: int
+        :param distance: Distance along curve (Must be smaller than
+                         size**2 - 1)
+        :type distance: int
+        """
 
-        yield x, y
+        self.size = 2 * (1 << (size-1).bit_length())
+        if (distance > self.size**2 - 1):
+            raise ValueError("Invalid distance!")
+        self.distance = distance
+        self.length = distance
+        self.seek(0)
+
+    def generate(self, start):
+        size = self.size
+        for d in range(start, self.distance):
+            yield hilbertd2xy(size, d)
+
+    def index_of(self, x, y):
+        if not (0 <= x < self.size and 0 <= y < self.size):
+            raise ValueError("Point not in scan")
+        distance = hilbertxy2d(self.size, x, y)
+        if distance >= self.distance:
+            raise ValueError("Point not in scan")
+        return distance
+
+    def point(self, index):
+        return hilbertd2xy(self.size, index)
+
+
+class interlacescan(_ScanPattern):
+    """Scan pixels of a rectangle in coarse to fine interlaced passes. This is
+    a generalization of the Adam7 interlacing of PNG images (levels = 3). The
+    first pass visits one pixel of every block of 2**levels pixels square.
+    Each following pair of passes halves the block width then height, so the
+    whole rectangle is covered at a finer resolution after every other pass.
+    Each pixel is visited exactly once and each pass is scanned along the
+    x-coordinate then y-coordinate.
+    """
 
-        # Take random step
-        probability = random.random()
-        if probability <= cxn:
-            x -= 1
-        elif probability <= cxp:
-            x += 1
-        elif probability <= cyn:
-            y -= 1
-        else:
-            y += 1
+    def __init__(self, xi, yi, xf, yf, levels=3, chunksize=None):
+        """
+        :param xi: Initial x-coordinate
+        :type xi: int
+        :param yi: Initial y-coordinate
+        :type yi: int
+        :param xf: Final x-coordinate
+        :type xf: int
+        :param yf: Final y-coordinate
+        :type yf: int
+        :param levels: Number of resolution halvings (default = 3)
+        :type levels: int
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+
+        # Validate inputs
+        if levels < 0:
+            raise ValueError("Levels must be non-negative")
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        # Determine direction to move
+        dx = 1 if xf >= xi else -1
+        dy = 1 if yf >= yi else -1
+
+        self.xs = range(xi, xf + dx, dx)
+        self.ys = range(yi, yf + dy, dy)
+        self.levels = levels
+        self.chunksize = chunksize
+
+        # Column and row index ranges of each pass
+        block = 1 << levels
+        nx, ny = len(self.xs), len(self.ys)
+        self.passes = [(range(0, nx, block), range(0, ny, block))]
+        while block > 1:
+            half = block // 2
+            self.passes.append((range(half, nx, block), range(0, ny, block)))
+            self.passes.append((range(0, nx, half), range(half, ny, block)))
+            block = half
+
+        self.passcounts = [len(columns) * len(rows)
+                           for columns, rows in self.passes]
+        self.offsets = list(itertools.accumulate([0] + self.passcounts))
+        self.length = self.offsets[-1]
+        self.seek(0)
+
+    @property
+    def levelcounts(self):
+        """Number of points scanned when each resolution level is complete,
+        from the coarsest level (blocks of 2**levels pixels) to the full
+        resolution
+        """
+        return self.offsets[1::2]
+
+    def generate(self, start):
+        points = self.interlace(start)
+        if self.chunksize is not None:
+            points = _chunkpoints(points, self.chunksize)
+        return points
+
+    def interlace(self, start):
+        """Generate the points of all passes skipping the first start points
+        """
+        xs, ys = self.xs, self.ys
+        first = bisect.bisect_right(self.offsets, start) - 1
+        for n in range(first, len(self.passes)):
+            columns, rows = self.passes[n]
+            if self.passcounts[n] == 0:
+                continue
+            row, column = divmod(max(start - self.offsets[n], 0),
+                                 len(columns))
+            for j in rows[row:]:
+                y = ys[j]
+                for i in columns[column:]:
+                    yield xs[i], y
+                column = 0
+
+    def point(self, index):
+        n = bisect.bisect_right(self.offsets, index) - 1
+        columns, rows = self.passes[n]
+        row, column = divmod(index - self.offsets[n], len(columns))
+        return self.xs[columns[column]], self.ys[rows[row]]
+
+    def index_of(self, x, y):
+        if x not in self.xs or y not in self.ys:
+            raise ValueError("Point not in scan")
+        i, j = self.xs.index(x), self.ys.index(y)
+        for n, (columns, rows) in enumerate(self.passes):
+            if i in columns and j in rows:
+                return (self.offsets[n] +
+                        rows.index(j) * len(columns) + columns.index(i))
+
+
+class maskscan(_ScanPattern):
+    """Scan the set pixels of a mask in a grid or snake pattern along the
+    x-coordinate then y-coordinate. The mask rows are run-length encoded so
+    unset pixels are never visited. Pass a RunLengthMask to reuse the
+    encoding across many scans of the same mask.
+    """
+
+    def __init__(self, mask, order="grid", width=None, chunksize=None):
+        """
+        :param mask: Mask indexed as mask[y][x], flat bytes-like mask or
+                     RunLengthMask
+        :type mask: sequence
+        :param order: Scan order "grid" or "snake" (default = "grid")
+        :type order: str
+        :param width: Row width, required for flat bytes-like masks
+        :type width: int
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+
+        # Validate inputs
+        if order not in ("grid", "snake"):
+            raise ValueError("Order must be 'grid' or 'snake'")
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+        if not isinstance(mask, RunLengthMask):
+            mask = RunLengthMask(mask, width)
+
+        self.mask = mask
+        self.order = order
+        self.chunksize = chunksize
+        self.length = mask.count
+        self.seek(0)
+
+    def generate(self, start):
+        return _spanpoints(self.runs(), start, self.chunksize)
+
+    def spans(self):
+        return _runspans(self.runs())
+
+    def runs(self):
+        """Generate the (y, xstart, xend) runs in scan order
+        """
+        snake = self.order == "snake"
+        for y, runs in enumerate(self.mask.runs):
+            if snake and y % 2 == 1:
+                for xa, xb in reversed(runs):
+                    yield y, xb, xa
+            else:
+                for xa, xb in runs:
+                    yield y, xa, xb
+
+
+class _CenterPattern(_ScanPattern):
+    """Base class of patterns that place a template of point offsets around
+    each of many centers. The template is computed once and the points are
+    scanned center by center, optionally clipped to bounds. Subclasses set
+    the template before calling setup().
+    """
+
+    def setup(self, centers, minx, maxx, miny, maxy, chunksize):
+        bounds = (minx, maxx, miny, maxy)
+        if any(bound is None for bound in bounds):
+            if any(bound is not None for bound in bounds):
+                raise ValueError("Bounds must be all set or all None")
+            bounds = None
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        self.centers = _pointbuffer(*(tuple(zip(*centers)) or ((), ())))
+        self.bounds = bounds
+        self.chunksize = chunksize
+        self.total = len(self.centers) * len(self.template)
+        self.length = self.total if bounds is None else None
+        self.seek(0)
+
+    def asarray(self):
+        """Convert points to an (n_centers, n_offsets, 2) numpy array by
+        broadcasting the template against the centers. If bounds are given
+        then this is a masked array with the points outside the bounds
+        masked. Requires numpy.
+
+        :returns: Points array
+        :rtype: numpy.ndarray
+        """
+        import numpy
+        points = (self.centers.asarray()[:, None, :] +
+                  self.template.asarray()[None, :, :])
+        if self.bounds is None:
+            return points
+        minx, maxx, miny, maxy = self.bounds
+        xs, ys = points[..., 0], points[..., 1]
+        outside = (xs < minx) | (xs > maxx) | (ys < miny) | (ys > maxy)
+        return numpy.ma.masked_array(
+            points, numpy.repeat(outside[..., None], 2, axis=-1))
+
+    def columns(self, first):
+        """Generate the x and y coordinate lists of the points around each
+        center starting at the given center index
+        """
+        dxs, dys = self.template.xs, self.template.ys
+        centers = zip(self.centers.xs[first:], self.centers.ys[first:])
+        if self.bounds is None:
+            for cx, cy in centers:
+                yield [cx + dx for dx in dxs], [cy + dy for dy in dys]
+            return
+
+        # Only templates crossing the bounds are clipped point by point
+        minx, maxx, miny, maxy = self.bounds
+        tminx, tmaxx, tminy, tmaxy = min(dxs), max(dxs), min(dys), max(dys)
+        for cx, cy in centers:
+            xs = [cx + dx for dx in dxs]
+            ys = [cy + dy for dy in dys]
+            if (minx <= cx + tminx and cx + tmaxx <= maxx and
+                    miny <= cy + tminy and cy + tmaxy <= maxy):
+                yield xs, ys
+                continue
+            keep = [minx <= x <= maxx and miny <= y <= maxy
+                    for x, y in zip(xs, ys)]
+            yield (list(itertools.compress(xs, keep)),
+                   list(itertools.compress(ys, keep)))
+
+    def generate(self, start):
+        first = 0
+        if self.bounds is None:
+            first = start // len(self.template)
+            start -= first * len(self.template)
+        return _columnpoints(self.columns(first), start, self.chunksize)
+
+    def point(self, index):
+        if self.bounds is not None:
+            raise TypeError("Scan does not support random access")
+        center, offset = divmod(index, len(self.template))
+        return (self.centers.xs[center] + self.template.xs[offset],
+                self.centers.ys[center] + self.template.ys[offset])
+
+    def remaining(self):
+        # Clipped points are not known until scanned
+        return max(self.total - self.index, 0)
+
+
+def _columnpoints(columns, start=0, chunksize=None):
+    """Generate the points of an iterator of x and y coordinate lists,
+    skipping the first start points. If chunksize is given then the points
+    are yielded as PointBuffer chunks.
+    """
+    chunkxs, chunkys = [], []
+    for xs, ys in columns:
+        if start > 0:
+            if start >= len(xs):
+                start -= len(xs)
+                continue
+            xs, ys, start = xs[start:], ys[start:], 0
+
+        if chunksize is None:
+            for point in zip(xs, ys):
+                yield point
+            continue
+
+        chunkxs.extend(xs)
+        chunkys.extend(ys)
+        while len(chunkxs) >= chunksize:
+            yield _pointbuffer(chunkxs[:chunksize], chunkys[:chunksize])
+            del chunkxs[:chunksize], chunkys[:chunksize]
+    if chunkxs:
+        yield _pointbuffer(chunkxs, chunkys)
+
+
+class multicirclescan(_CenterPattern):
+    """Scan pixels in a circle pattern around each of many center points. The
+    circle offsets are computed once and shared by all centers.
+    """
+
+    def __init__(self, centers, r1, r2, minx=None, maxx=None, miny=None,
+                 maxy=None, chunksize=None):
+        """
+        :param centers: Center (x, y) points (e.g., (n, 2) numpy array)
+        :type centers: sequence
+        :param r1: Initial radius
+        :type r1: float
+        :param r2: Final radius
+        :type r2: float
+        :param minx: Minimum x-coordinate of clipping bounds (default = None)
+        :type minx: int
+        :param maxx: Maximum x-coordinate of clipping bounds (default = None)
+        :type maxx: int
+        :param miny: Minimum y-coordinate of clipping bounds (default = None)
+        :type miny: int
+        :param maxy: Maximum y-coordinate of clipping bounds (default = None)
+        :type maxy: int
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+        self.template = _pointbuffer(*zip(*circlescan(0, 0, r1, r2)))
+        self.setup(centers, minx, maxx, miny, maxy, chunksize)
+
+
+class multiringscan(_CenterPattern):
+    """Scan pixels in a ring pattern around each of many center points. The
+    ring offsets are computed once and shared by all centers.
+    """
+
+    def __init__(self, centers, r1, r2, metric=chebyshev, minx=None,
+                 maxx=None, miny=None, maxy=None, chunksize=None):
+        """
+        :param centers: Center (x, y) points (e.g., (n, 2) numpy array)
+        :type centers: sequence
+        :param r1: Initial radius
+        :type r1: int
+        :param r2: Final radius
+        :type r2: int
+        :param metric: Distance metric
+        :type metric: function
+        :param minx: Minimum x-coordinate of clipping bounds (default = None)
+        :type minx: int
+        :param maxx: Maximum x-coordinate of clipping bounds (default = None)
+        :type maxx: int
+        :param miny: Minimum y-coordinate of clipping bounds (default = None)
+        :type miny: int
+        :param maxy: Maximum y-coordinate of clipping bounds (default = None)
+        :type maxy: int
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+        self.template = _pointbuffer(*zip(*ringscan(0, 0, r1, r2, metric)))
+        self.setup(centers, minx, maxx, miny, maxy, chunksize)
+
+
+class permutescan(_ScanPattern):
+    """Scan every pixel of a rectangle exactly once in a pseudorandom order.
+    Grid scan indices are permuted by a keyed Feistel network over the
+    smallest power of four covering the rectangle, cycle-walking until an
+    index falls inside it. No permutation is stored so memory use is
+    constant and any point can be computed from its index. The scan can be
+    split into shards that together visit every pixel once.
+    """
+
+    def __init__(self, xi, yi, xf, yf, seed=None, shard=0, nshards=1,
+                 rounds=6, chunksize=None):
+        """
+        :param xi: Initial x-coordinate
+        :type xi: int
+        :param yi: Initial y-coordinate
+        :type yi: int
+        :param xf: Final x-coordinate
+        :type xf: int
+        :param yf: Final y-coordinate
+        :type yf: int
+        :param seed: Seed of a private random number generator for the
+                     permutation keys. If None then the global random module
+                     is used (default = None)
+        :type seed: int
+        :param shard: 0-based index of the shard to scan (default = 0)
+        :type shard: int
+        :param nshards: Number of shards (default = 1)
+        :type nshards: int
+        :param rounds: Number of Feistel rounds (default = 6)
+        :type rounds: int
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+
+        # Validate inputs
+        if nshards <= 0:
+            raise ValueError("Number of shards must be positive")
+        if not 0 <= shard < nshards:
+            raise ValueError("Shard must be in range [0,nshards)")
+        if rounds <= 0:
+            raise ValueError("Rounds must be positive")
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        # Determine direction to move
+        dx = 1 if xf >= xi else -1
+        dy = 1 if yf >= yi else -1
+
+        self.xs = range(xi, xf + dx, dx)
+        self.ys = range(yi, yf + dy, dy)
+        self.area = len(self.xs) * len(self.ys)
+        self.shard = shard
+        self.nshards = nshards
+        self.chunksize = chunksize
+        self.length = len(range(shard, self.area, nshards))
+
+        # Feistel halves of the permuted index
+        self.bits = ((self.area - 1).bit_length() + 1) // 2
+        rng = random if seed is None else random.Random(seed)
+        self.keys = [rng.getrandbits(64) for _ in range(rounds)]
+        self.seek(0)
+
+    def generate(self, start):
+        points = map(self.point, range(start, self.length))
+        if self.chunksize is not None:
+            points = _chunkpoints(points, self.chunksize)
+        return points
+
+    def index_of(self, x, y):
+        if x not in self.xs or y not in self.ys:
+            raise ValueError("Point not in scan")
+        index = self.unpermute(self.ys.index(y) * len(self.xs) +
+                               self.xs.index(x))
+        index, shard = divmod(index - self.shard, self.nshards)
+        if shard != 0:
+            raise ValueError("Point not in scan")
+        return index
+
+    def point(self, index):
+        index = self.permute(self.shard + index * self.nshards)
+        row, column = divmod(index, len(self.xs))
+        return self.xs[column], self.ys[row]
+
+    def permute(self, index):
+        """Permuted grid index of a grid index
+
+        :param index: Grid index
+        :type index: int
+        :returns: Permuted grid index
+        :rtype: int
+        """
+        bits = self.bits
+        mask = (1 << bits) - 1
+        while True:
+            left, right = index >> bits, index & mask
+            for key in self.keys:
+                left, right = right, left ^ (_feistelround(right, key) & mask)
+            index = left << bits | right
+            if index < self.area:
+                return index
+
+    def unpermute(self, index):
+        """Grid index of a permuted grid index. This is the inverse of
+        permute.
+
+        :param index: Permuted grid index
+        :type index: int
+        :returns: Grid index
+        :rtype: int
+        """
+        bits = self.bits
+        mask = (1 << bits) - 1
+        while True:
+            left, right = index >> bits, index & mask
+            for key in reversed(self.keys):
+                left, right = right ^ (_feistelround(left, key) & mask), left
+            index = left << bits | right
+            if index < self.area:
+                return index
+
+
+def _feistelround(value, key):
+    """Keyed 64-bit mixing function of a Feistel round
+    """
+    value = ((value ^ key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    value ^= value >> 29
+    value = (value * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 32)
+
+
+class quasiscan(_ScanPattern):
+    """Scan distinct pixels of a rectangle sampled by a low-discrepancy
+    sequence. The samples are spread more evenly over the rectangle than
+    independent random samples. Sequence points that fall on an already
+    visited pixel are skipped. The scrambled variant randomly shifts the
+    sequence (a Cranley-Patterson rotation for Halton and R2 or a digital
+    shift for Sobol), which keeps its low discrepancy.
+    """
+
+    SEQUENCES = ("halton", "sobol", "r2")
+
+    # Sequence points are 32-bit fractions and Sobol repeats after 2**32
+    LIMIT = 1 << 32
+
+    def __init__(self, xi, yi, xf, yf, n, sequence="halton", scramble=False,
+                 seed=None, chunksize=None):
+        """
+        :param xi: Initial x-coordinate
+        :type xi: int
+        :param yi: Initial y-coordinate
+        :type yi: int
+        :param xf: Final x-coordinate
+        :type xf: int
+        :param yf: Final y-coordinate
+        :type yf: int
+        :param n: Number of pixels to sample
+        :type n: int
+        :param sequence: Sequence "halton", "sobol" or "r2"
+                         (default = "halton")
+        :type sequence: str
+        :param scramble: True to randomly shift the sequence (default = False)
+        :type scramble: bool
+        :param seed: Seed of a private random number generator used to
+                     scramble. If None then the global random module is used
+                     (default = None)
+        :type seed: int
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+
+        # Determine direction to move
+        dx = 1 if xf >= xi else -1
+        dy = 1 if yf >= yi else -1
+
+        self.xs = range(xi, xf + dx, dx)
+        self.ys = range(yi, yf + dy, dy)
+
+        # Validate inputs
+        if sequence not in self.SEQUENCES:
+            raise ValueError("Sequence must be 'halton', 'sobol' or 'r2'")
+        if not 0 <= n <= len(self.xs) * len(self.ys):
+            raise ValueError("Number of points must be in range [0,area]")
+        if n >= self.LIMIT:
+            raise ValueError("Number of points must be less than 2**32")
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        self.sequence = sequence
+        self.chunksize = chunksize
+        self.length = n
+
+        # Sequence shifts as 32-bit fractions of the unit square
+        rng = random if seed is None else random.Random(seed)
+        self.shift = (0, 0)
+        if scramble:
+            self.shift = (rng.getrandbits(32), rng.getrandbits(32))
+        self.seek(0)
+
+    def seek(self, index):
+        if index >= self.LIMIT:
+            raise ValueError("Index must be less than 2**32")
+        super().seek(index)
+
+    def generate(self, start):
+        self.draws = 0
+        self.visited = PixelSet(0, len(self.xs) - 1, 0, len(self.ys) - 1)
+        points = self.samples()
+        for _ in itertools.islice(points, start):
+            pass
+        return self.chunks(points)
+
+    def resume(self):
+        return self.chunks(self.samples())
+
+    def chunks(self, points):
+        """Group points into chunks if a chunk size is set
+        """
+        if self.chunksize is None:
+            return points
+        return _chunkpoints(points, self.chunksize)
+
+    def samples(self):
+        """Generate the remaining distinct pixels continuing the sequence
+        after the last sample drawn
+        """
+        xs, ys = self.xs, self.ys
+        nx, ny = len(xs), len(ys)
+        visited = self.visited
+        if len(visited) >= self.length:
+            return
+
+        # Test and set the bits of the visited pixels inline since every
+        # pixel is inside the bitset bounds
+        bits = visited.bits
+        draws, count, length = self.draws, visited.nbits, self.length
+        sequence = _QUASISEQUENCES[self.sequence]
+        for u, v in sequence(draws, self.shift):
+            draws += 1
+            k = ((v * ny) >> 32) * nx + ((u * nx) >> 32)
+            bit = 1 << (k & 7)
+            if bits[k >> 3] & bit:
+                continue
+            bits[k >> 3] |= bit
+            count += 1
+            self.draws, visited.nbits = draws, count
+            yield xs[k % nx], ys[k // nx]
+            if count >= length:
+                return
+
+
+def _halton(start, shift):
+    """Generate the 2D Halton sequence (bases 2 and 3) from the given index
+    as 32-bit fractions shifted modulo one
+    """
+    sx, sy = shift
+    r2, r3 = _REVERSE2, _REVERSE3
+    for index in itertools.count(start):
+
+        # Reverse the digits a table lookup at a time
+        u = (r2[index & 255] << 24 | r2[index >> 8 & 255] << 16 |
+             r2[index >> 16 & 255] << 8 | r2[index >> 24 & 255])
+        if index < 3 ** 24:
+            q, d0 = divmod(index, 6561)
+            d2, d1 = divmod(q, 6561)
+            v = (r3[d0] * 6561 + r3[d1]) * 6561 + r3[d2]
+            v = (v << 32) // 3 ** 24
+        else:
+            v, f, i = 0, 1, index
+            while i > 0:
+                f *= 3
+                i, digit = divmod(i, 3)
+                v = v * 3 + digit
+            v = (v << 32) // f
+        yield (u + sx) & 0xFFFFFFFF, (v + sy) & 0xFFFFFFFF
+
+
+def _reversetable(base, digits):
+    """Table of the base digit reversal of all numbers with the given number
+    of digits
+    """
+    table = [0]
+    scale = 1
+    for _ in range(digits):
+        table = [digit * scale + t for t in table for digit in range(base)]
+        scale *= base
+    return table
+
+
+_REVERSE2 = _reversetable(2, 8)
+_REVERSE3 = _reversetable(3, 8)
+
+
+def _sobol(start, shift):
+    """Generate the 2D Sobol sequence from the given index as 32-bit
+    fractions digitally shifted by xor. The sequence has 2**32 points.
+    """
+    sx, sy = shift
+    if start >= 1 << 32:
+        raise ValueError("Sobol index must be less than 2**32")
+
+    # Gray code of the index selects the direction numbers to combine
+    gray = start ^ (start >> 1)
+    u = int("{:032b}".format(gray & 0xFFFFFFFF)[::-1], 2)
+    v = 0
+    for bit in range(gray.bit_length()):
+        if gray >> bit & 1:
+            v ^= _SOBOLY[bit]
+    for index in itertools.count(start):
+        yield u ^ sx, v ^ sy
+
+        # The next point flips the direction of the lowest zero bit
+        bit = (~index & (index + 1)).bit_length() - 1
+        if bit > 31:
+            raise ValueError("Sobol sequence exhausted after 2**32 points")
+        u ^= 1 << (31 - bit)
+        v ^= _SOBOLY[bit]
+
+
+def _soboly():
+    # Direction numbers of the second Sobol dimension (polynomial x + 1)
+    directions, direction = [], 1 << 31
+    for _ in range(64):
+        directions.append(direction)
+        direction ^= direction >> 1
+    return directions
+
+
+_SOBOLY = _soboly()
+
+
+def _r2(start, shift):
+    """Generate the R2 sequence of M. Roberts from the given index as 32-bit
+    fractions shifted modulo one
+    """
+    sx, sy = shift
+
+    # Plastic constant multiples as 64-bit fractions for exact stepping
+    g = 1.32471795724474602596
+    a1, a2 = int((2 ** 64) / g), int((2 ** 64) / (g * g))
+    u = (1 << 63) + a1 * start
+    v = (1 << 63) + a2 * start
+    for index in itertools.count(start):
+        yield ((u >> 32) + sx) & 0xFFFFFFFF, ((v >> 32) + sy) & 0xFFFFFFFF
+        u += a1
+        v += a2
+        u &= 0xFFFFFFFFFFFFFFFF
+        v &= 0xFFFFFFFFFFFFFFFF
+
+
+_QUASISEQUENCES = {"halton": _halton, "sobol": _sobol, "r2": _r2}
+
+
+class regionscan(_ScanPattern):
+    """Scan the pixels of a Region in a grid or snake pattern along the
+    x-coordinate then y-coordinate. Snake rows alternate direction by the
+    parity of the y-coordinate.
+    """
+
+    def __init__(self, region, order="grid", chunksize=None):
+        """
+        :param region: Region to scan
+        :type region: Region
+        :param order: Scan order "grid" or "snake" (default = "grid")
+        :type order: str
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+
+        # Validate inputs
+        if order not in ("grid", "snake"):
+            raise ValueError("Order must be 'grid' or 'snake'")
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        self.region = region
+        self.order = order
+        self.chunksize = chunksize
+        self.length = region.count
+
+        # Index of the first point of each row for random access
+        self.ys = list(region.rows)
+        self.offsets = list(itertools.accumulate(
+            (sum(xb - xa + 1 for xa, xb in region.rows[y]) for y in self.ys),
+            initial=0))
+        self.seek(0)
+
+    def generate(self, start):
+        return _spanpoints(self.runs(), start, self.chunksize)
+
+    def spans(self):
+        return _runspans(self.runs())
+
+    def index_of(self, x, y):
+        if (x, y) not in self.region:
+            raise ValueError("Point not in scan")
+        row = bisect.bisect_left(self.ys, y)
+        offset = 0
+        for xa, xb in self.region.rows[y]:
+            if x <= xb:
+                offset += x - xa
+                break
+            offset += xb - xa + 1
+        if self.reversed(y):
+            return self.offsets[row + 1] - 1 - offset
+        return self.offsets[row] + offset
+
+    def point(self, index):
+        row = bisect.bisect_right(self.offsets, index) - 1
+        y = self.ys[row]
+        offset = index - self.offsets[row]
+        if self.reversed(y):
+            offset = self.offsets[row + 1] - 1 - index
+        for xa, xb in self.region.rows[y]:
+            if offset <= xb - xa:
+                return xa + offset, y
+            offset -= xb - xa + 1
+
+    def reversed(self, y):
+        """True if the row at the y-coordinate is scanned in -x direction
+        """
+        return self.order == "snake" and y % 2 == 1
+
+    def runs(self):
+        """Generate the (y, xstart, xend) runs in scan order
+        """
+        for y, runs in self.region.rows.items():
+            if self.reversed(y):
+                for xa, xb in reversed(runs):
+                    yield y, xb, xa
+            else:
+                for xa, xb in runs:
+                    yield y, xa, xb
+
+
+class ringscan(_ScanPattern):
+    """Scan pixels in a ring pattern around a center point clockwise
+    """
+
+    # Clockwise step directions
+    STEPS = ((1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1),
+             (1, 1))
+
+    def __init__(self, x0, y0, r1, r2, metric=chebyshev):
+        """
+        :param x0: Center x-coordinate
+        :type x0: int
+        :param y0: Center y-coordinate
+        :type y0: int
+        :param r1: Initial radius
+        :type r1: int
+        :param r2: Final radius
+        :type r2: int
+        :param metric: Distance metric
+        :type metric: function
+        """
+
+        # Validate inputs
+        if r1 < 0:
+            raise ValueError("Initial radius must be non-negative")
+        if r2 < 0:
+            raise ValueError("Final radius must be non-negative")
+        if not hasattr(metric, "__call__"):
+            raise TypeError("Metric not callable")
+
+        self.x0 = x0
+        self.y0 = y0
+        self.r1 = r1
+        self.r2 = r2
+        self.metric = metric
+
+        # Scan distances outward (1) or inward (-1)
+        rstep = 1 if r2 >= r1 else -1
+        self.distances = range(r1, r2 + rstep, rstep)
+
+        # Rings of the builtin metrics have a known number of points
+        perimeter = {chebyshev: 8, manhattan: 4}.get(metric)
+        if perimeter is not None:
+            self.length = sum(perimeter * distance or 1
+                              for distance in self.distances)
+        self.ring, self.current, self.direction, self.visited = 0, None, 0, 0
+        self.seek(0)
+
+    def generate(self, start):
+        if self.length is None:
+            return itertools.islice(self.rings(0, None, 0, 0), start, None)
+        if start >= self.length:
+            return iter(())
+
+        # Resume after the point before start with the step leading to it
+        ring = self.ringindex(start)
+        if start == self.ringoffset(ring):
+            return self.rings(ring, None, 0, start)
+        x, y = self.point(start - 1)
+        xn, yn = self.point(start)
+        direction = self.STEPS.index((xn - x, yn - y))
+        return self.rings(ring, [x, y], direction, start)
+
+    def index_of(self, x, y):
+        if self.length is None:
+            raise TypeError("Scan does not support inverse lookup")
+        dx, dy = x - self.x0, y - self.y0
+        distance = self.metric((0, 0), (dx, dy))
+        if distance not in self.distances:
+            raise ValueError("Point not in scan")
+        index = self.ringoffset(self.distances.index(distance))
+        if distance == 0:
+            return index
+
+        # Offset clockwise from the top of the ring
+        d = distance
+        if self.metric is chebyshev:
+            if dy == d and dx >= 0:
+                return index + dx
+            if dx == d:
+                return index + 2 * d - dy
+            if dy == -d:
+                return index + 4 * d - dx
+            if dx == -d:
+                return index + 6 * d + dy
+            return index + 8 * d + dx
+        if dx >= 0 and dy > 0:
+            return index + dx
+        if dx > 0:
+            return index + d - dy
+        if dy < 0:
+            return index + 2 * d - dx
+        return index + 3 * d + dy
+
+    def point(self, index):
+        if self.length is None:
+            raise TypeError("Scan does not support random access")
+
+        ring = self.ringindex(index)
+        d = self.distances[ring]
+        k = index - self.ringoffset(ring)
+
+        # Walk clockwise from the top of the ring
+        if d == 0:
+            dx, dy = 0, 0
+        elif self.metric is chebyshev:
+            if k <= d:
+                dx, dy = k, d
+            elif k <= 3 * d:
+                dx, dy = d, 2 * d - k
+            elif k <= 5 * d:
+                dx, dy = 4 * d - k, -d
+            elif k <= 7 * d:
+                dx, dy = -d, k - 6 * d
+            else:
+                dx, dy = k - 8 * d, d
+        elif k < d:
+            dx, dy = k, d - k
+        elif k < 2 * d:
+            dx, dy = 2 * d - k, d - k
+        elif k < 3 * d:
+            dx, dy = 2 * d - k, k - 3 * d
+        else:
+            dx, dy = k - 4 * d, k - 3 * d
+        return self.x0 + dx, self.y0 + dy
+
+    def ringindex(self, index):
+        """Index of the ring containing the given point index for the builtin
+        metrics
+        """
+        lo, hi = 0, len(self.distances) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.ringoffset(mid) <= index:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def ringoffset(self, ring):
+        """Number of points in the rings before the given ring index for the
+        builtin metrics
+        """
+        perimeter = 8 if self.metric is chebyshev else 4
+        inner = self.distances[:ring]
+        if not inner:
+            return 0
+        offset = perimeter * (inner[0] + inner[-1]) * len(inner) // 2
+        return offset + 1 if 0 in inner else offset
+
+    def resume(self):
+
+        # Other metrics resume from the last generated point if it is the
+        # one before the index
+        if self.length is None and 0 < self.index == self.visited:
+            return self.rings(self.ring, self.current, self.direction,
+                              self.visited)
+        return self.generate(self.index)
+
+    def rings(self, ring, current, direction, count):
+        """Generate the points of the scan starting at the given ring index.
+        If current is given then the scan resumes after that point with the
+        step direction that leads to the next point. The count is the number
+        of points before the first one generated.
+        """
+        metric = self.metric
+        steps = self.STEPS
+        nsteps = len(steps)
+
+        center = [self.x0, self.y0]
+
+        for ring in range(ring, len(self.distances)):
+            distance = self.distances[ring]
+
+            initial = [self.x0, self.y0 + distance]
+
+            # Number of tries to find a valid neighrbor
+            ntrys = 0
+
+            # Resume after the last visited point
+            if current is None:
+                current = initial
+            else:
+                if distance == 0:
+                    current = None
+                    continue
+                current = [current[i] + steps[direction][i]
+                           for i in range(2)]
+                if current == initial:
+                    current = None
+                    continue
+
+            while True:
+
+                # Short-circuit special case
+                if distance == 0:
+                    count += 1
+                    self.ring, self.current, self.visited = (ring, current,
+                                                             count)
+                    yield current[0], current[1]
+                    break
+
+                # Try and take a step and check if still within distance
+                nextpoint = [current[i] + steps[direction][i]
+                             for i in range(2)]
+                if metric(center, nextpoint) != distance:
+
+                    # Check if we tried all step directions and failed
+                    ntrys += 1
+                    if ntrys == nsteps:
+                        break
+
+                    # Try the next direction
+                    direction = (direction + 1) % nsteps
+                    continue
+
+                ntrys = 0
+                count += 1
+                self.ring, self.current, self.direction = (ring, current,
+                                                           direction)
+                self.visited = count
+                yield current[0], current[1]
+
+                # Check if we have come all the way around
+                current = nextpoint
+                if current == initial:
+                    break
+
+            # Check if we tried all step directions and failed
+            if ntrys == nsteps:
+                break
+            current = None
+
+
+class rotatescan(_ScanPattern):
+    """Scan the pixels of a rectangle rotated counter-clockwise about the
+    origin. Unlike applying the rotation transformation to a grid scan, the
+    destination pixels are iterated directly along the x-coordinate then
+    y-coordinate and inverse-mapped into the rectangle, so each destination
+    pixel is visited exactly once with no duplicates or holes. A destination
+    pixel is included if its inverse rotation rounds to a pixel of the
+    rectangle. Multiples of 90 degrees use exact integer arithmetic.
+    """
+
+    def __init__(self, xi, yi, xf, yf, angle=0, chunksize=None):
+        """
+        :param xi: Initial x-coordinate of rectangle
+        :type xi: int
+        :param yi: Initial y-coordinate of rectangle
+        :type yi: int
+        :param xf: Final x-coordinate of rectangle
+        :type xf: int
+        :param yf: Final y-coordinate of rectangle
+        :type yf: int
+        :param angle: Counter-clockwise angle in degrees (default = 0)
+        :type angle: float
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        self.chunksize = chunksize
+        self.rows = list(_rotatespans(xi, yi, xf, yf, angle))
+        self.length = sum(xb - xa + 1 for y, xa, xb in self.rows)
+        self.seek(0)
+
+    def generate(self, start):
+        return _spanpoints(self.rows, start, self.chunksize)
+
+    def spans(self):
+        return _runspans(self.rows)
+
+
+def _rotatespans(xi, yi, xf, yf, angle):
+    """Generate the (y, xstart, xend) row spans of a rotated rectangle in
+    increasing y order. Spans are inclusive.
+    """
+    xmin, xmax = min(xi, xf), max(xi, xf)
+    ymin, ymax = min(yi, yf), max(yi, yf)
+
+    # Integer fast path for multiples of 90 degrees
+    if angle % 90 == 0:
+        quadrant = int(angle // 90) % 4
+        if quadrant == 0:
+            xs, ys = (xmin, xmax), (ymin, ymax)
+        elif quadrant == 1:
+            xs, ys = (-ymax, -ymin), (xmin, xmax)
+        elif quadrant == 2:
+            xs, ys = (-xmax, -xmin), (-ymax, -ymin)
+        else:
+            xs, ys = (ymin, ymax), (-xmax, -xmin)
+        for y in range(ys[0], ys[1] + 1):
+            yield y, xs[0], xs[1]
+        return
+
+    theta = angle * (math.pi / 180.0)
+    ca, sa = math.cos(theta), math.sin(theta)
+    ulo, uhi = xmin - 0.5, xmax + 0.5
+    vlo, vhi = ymin - 0.5, ymax + 0.5
+
+    # Destination pixel is inside if its inverse rotation (u, v) rounds to a
+    # pixel of the rectangle
+    def inside(x, y):
+        u = ca * x + sa * y
+        v = -sa * x + ca * y
+        return ulo <= u < uhi and vlo <= v < vhi
+
+    # Row limits from the rotated corners with a one pixel margin
+    corners = [(u, v) for u in (ulo, uhi) for v in (vlo, vhi)]
+    ycorners = [sa * u + ca * v for u, v in corners]
+    xcorners = [ca * u - sa * v for u, v in corners]
+    y0 = int(math.floor(min(ycorners))) - 1
+    y1 = int(math.ceil(max(ycorners))) + 1
+
+    for y in range(y0, y1 + 1):
+
+        # Intersect the x-intervals where u and v are within bounds. Each
+        # constraint is linear in x along the row.
+        lo, hi = min(xcorners), max(xcorners)
+        for a, b, clo, chi in ((ca, sa * y, ulo, uhi),
+                               (-sa, ca * y, vlo, vhi)):
+            if a != 0:
+                xa, xb = sorted(((clo - b) / a, (chi - b) / a))
+                lo, hi = max(lo, xa), min(hi, xb)
+            elif not clo <= b < chi:
+                lo, hi = 1, 0
+        if lo > hi:
+            continue
+
+        # The span is convex so trimming its margin with the exact test
+        # yields exactly the inside pixels
+        xa = int(math.floor(lo)) - 1
+        xb = int(math.ceil(hi)) + 1
+        while xa <= xb and not inside(xa, y):
+            xa += 1
+        while xb >= xa and not inside(xb, y):
+            xb -= 1
+        if xa <= xb:
+            yield y, xa, xb
+
+
+class snakescan(_ScanPattern):
+    """Scan pixels in a snake pattern along the x-coordinate then y-coordinate
+    """
+
+    def __init__(self, xi, yi, xf, yf):
+        """
+        :param xi: Initial x-coordinate
+        :type xi: int
+        :param yi: Initial y-coordinate
+        :type yi: int
+        :param xf: Final x-coordinate
+        :type xf: int
+        :param yf: Final y-coordinate
+        :type yf: int
+        """
+
+        # Determine direction to move
+        dx = 1 if xf >= xi else -1
+        dy = 1 if yf >= yi else -1
+
+        self.xs = range(xi, xf + dx, dx)
+        self.ys = range(yi, yf + dy, dy)
+        self.length = len(self.xs) * len(self.ys)
+        self.seek(0)
+
+    def generate(self, start):
+
+        # Scan pixels first along x-coordinate then y-coordinate and flip
+        # x-direction at the end of every line
+        xs = (self.xs, self.xs[::-1])
+        row, column = divmod(start, len(self.xs))
+        for r in range(row, len(self.ys)):
+            y = self.ys[r]
+            for x in xs[r % 2][column:]:
+                yield x, y
+            column = 0
+
+    def index_of(self, x, y):
+        if x not in self.xs or y not in self.ys:
+            raise ValueError("Point not in scan")
+        row, column = self.ys.index(y), self.xs.index(x)
+        if row % 2 == 1:
+            column = len(self.xs) - 1 - column
+        return row * len(self.xs) + column
+
+    def point(self, index):
+        row, column = divmod(index, len(self.xs))
+        if row % 2 == 1:
+            column = len(self.xs) - 1 - column
+        return self.xs[column], self.ys[row]
+
+    def spans(self):
+        xs = self.xs
+        for row, y in enumerate(self.ys):
+            if row % 2 == 1:
+                yield Span(y, xs[-1], xs[0], -xs.step)
+            else:
+                yield Span(y, xs[0], xs[-1], xs.step)
+
+
+class walkscan(_ScanPattern):
+    """Scan pixels in a random walk pattern with given step probabilities. The
+    random walk will continue indefinitely unless a skip transformation is used
+    with the 'stop' parameter set or a clip transformation is used with the
+    'abort' parameter set to True. The probabilities are normalized to one.
+
+    In chunked mode the step directions of a whole chunk are drawn at once and
+    the positions are computed with a cumulative sum, which is much faster
+    for long walks. Chunked and unchunked walks draw different random
+    sequences so the same seed gives different walks in the two modes.
+    """
+
+    def __init__(self, x0, y0, xn=0.25, xp=0.25, yn=0.25, yp=0.25,
+                 chunksize=None, seed=None):
+        """
+        :param x0: Initial x-coordinate
+        :type x0: int
+        :param y0: Initial y-coordinate
+        :type y0: int
+        :param xn: Probability of moving in the negative x direction
+        :type xn: float
+        :param xp: Probability of moving in the positive x direction
+        :type xp: float
+        :param yn: Probability of moving in the negative y direction
+        :type yn: float
+        :param yp: Probability of moving in the positive y direction
+        :type yp: float
+        :param chunksize: If given, yield PointBuffer chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        :param seed: Seed of a private random number generator. If None then
+                     the global random module is used (default = None)
+        :type seed: int
+        """
+
+        # Validate inputs
+        if xn < 0:
+            raise ValueError("Negative x probabilty must be non-negative")
+        if xp < 0:
+            raise ValueError("Positive x probabilty must be non-negative")
+        if yn < 0:
+            raise ValueError("Negative y probabilty must be non-negative")
+        if yp < 0:
+            raise ValueError("Positive y probabilty must be non-negative")
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        # Compute normalized probability
+        total = xp + xn + yp + yn
+        xn /= total
+        xp /= total
+        yn /= total
+
+        # Compute cumulative probability
+        cxn = xn
+        cxp = cxn + xp
+        cyn = cxp + yn
+        self.cumulative = (cxn, cxp, cyn)
+
+        self.x0 = x0
+        self.y0 = y0
+        self.chunksize = chunksize
+        self.rng = random if seed is None else random.Random(seed)
+        self.seek(0)
+
+    def generate(self, start):
+        self.x, self.y, self.position = self.x0, self.y0, 0
+        if self.chunksize is not None:
+            return self.skipchunks(start)
+        return itertools.islice(self.walk(False), start, None)
+
+    def resume(self):
+
+        # Replay the walk if the index was moved by seeking
+        if self.position != self.index:
+            return self.generate(self.index)
+        if self.chunksize is not None:
+            return self.chunks()
+        return self.walk(self.index > 0)
+
+    def chunks(self):
+        """Generate the walk in chunks with bulk drawn steps starting from the
+        current position
+        """
+        table = _walktable(self.cumulative)
+        while True:
+            stepx, stepy = _walksteps(self.rng, table, self.cumulative,
+                                      self.chunksize)
+            xs = array.array("q", itertools.accumulate(stepx, initial=self.x))
+            ys = array.array("q", itertools.accumulate(stepy, initial=self.y))
+            self.x, self.y = xs.pop(), ys.pop()
+            self.position += len(xs)
+            yield PointBuffer(xs, ys)
+
+    def skipchunks(self, start):
+        """Generate the walk chunks skipping the first start points. The rest
+        of the chunk holding the start point is yielded as a shorter chunk so
+        the following chunks end where the drawn chunks end.
+        """
+        for chunk in self.chunks():
+            if start < len(chunk):
+                yield PointBuffer(chunk.xs[start:], chunk.ys[start:])
+                break
+            start -= len(chunk)
+        for chunk in self.chunks():
+            yield chunk
+
+    def walk(self, step):
+        """Generate the walk a step at a time starting from the current
+        position, optionally taking a step first
+        """
+        rng = self.rng
+        cxn, cxp, cyn = self.cumulative
+
+        # Initialize position
+        x, y = self.x, self.y
+
+        while True:
+
+            if step:
+
+                # Take random step
+                probability = rng.random()
+                if probability <= cxn:
+                    x -= 1
+                elif probability <= cxp:
+                    x += 1
+                elif probability <= cyn:
+                    y -= 1
+                else:
+                    y += 1
+
+            self.x, self.y = x, y
+            self.position += 1
+            yield x, y
+            step = True
+
+
+@functools.lru_cache(maxsize=32)
+def _walktable(cumulative):
+    """Quantize cumulative walk step probabilities into a lookup table that
+    maps uniform random bytes (or 16-bit words) to step directions. Table
+    entries whose interval straddles a probability boundary are set to 255
+    and must be resolved with an extra draw. Tables are cached per
+    probability tuple since walks are often created and resumed with the
+    same probabilities.
+    """
+    bits = 8 if all((c * 256).is_integer() for c in cumulative) else 16
+    nbins = 1 << bits
+    table = bytearray(nbins)
+    for u in range(nbins):
+        lo, hi = u / nbins, (u + 1) / nbins
+        if any(lo < c < hi for c in cumulative):
+            table[u] = 255
+        else:
+            table[u] = sum(1 for c in cumulative if c < hi)
+    return bytes(table)
+
+
+def _walkstep(probability, cumulative):
+    """Step direction (0 = -x, 1 = +x, 2 = -y, 3 = +y) of a probability
+    """
+    for direction, c in enumerate(cumulative):
+        if probability <= c:
+            return direction
+    return len(cumulative)
+
+
+# Step direction to x and y offsets as signed bytes
+_WALKX = bytes([255, 1, 0, 0]).ljust(256, b"\x00")
+_WALKY = bytes([0, 0, 255, 1]).ljust(256, b"\x00")
+
+
+def _walksteps(rng, table, cumulative, count):
+    """Draw the x and y offsets of count random walk steps in bulk as int8
+    arrays.
+    """
+    if len(table) == 256:
+        words = rng.getrandbits(8 * count).to_bytes(count, "little")
+        directions = bytearray(words.translate(table))
+    else:
+        words = array.array("H")
+        words.frombytes(rng.getrandbits(16 * count).to_bytes(2 * count,
+                                                             "little"))
+        if sys.byteorder == "big":
+            words.byteswap()
+        directions = bytearray(map(table.__getitem__, words))
+
+    # Resolve steps whose table entry straddles a probability boundary
+    nbins = len(table)
+    index = directions.find(255)
+    while index >= 0:
+        probability = (words[index] + rng.random()) / nbins
+        directions[index] = _walkstep(probability, cumulative)
+        index = directions.find(255, index + 1)
+
+    stepx = array.array("b")
+    stepx.frombytes(directions.translate(_WALKX))
+    stepy = array.array("b")
+    stepy.frombytes(directions.translate(_WALKY))
+    return stepx, stepy
+
+# ======================================================================
+# 3D scan transformations
+# ----------------------------------------------------------------------
+
+
+class clip3d(object):
+    """Clip 3D coordinates that exceed boundary. PointBuffer3D chunks from
+    the upstream scan are clipped a whole chunk at a time.
+    """
+    def __init__(self,
+                 scan,
+                 minx=-sys.maxsize,
+                 maxx=sys.maxsize,
+                 miny=-sys.maxsize,
+                 maxy=sys.maxsize,
+                 minz=-sys.maxsize,
+                 maxz=sys.maxsize,
+                 predicate=None,
+                 abort=False):
+        """
+        :param scan: Voxel scan generator
+        :type scan: function
+        :param minx: Minimum x-coordinate (default = -sys.maxsize)
+        :type minx: int
+        :param maxx: Maximum x-coordinate (default =  sys.maxsize)
+        :type maxx: int
+        :param miny: Minimum y-coordinate (default = -sys.maxsize)
+        :type miny: int
+        :param maxy: Maximum y-coordinate (default =  sys.maxsize)
+        :type maxy: int
+        :param minz: Minimum z-coordinate (default = -sys.maxsize)
+        :type minz: int
+        :param maxz: Maximum z-coordinate (default =  sys.maxsize)
+        :type maxz: int
+        :param predicate: Optional function that takes 3 arguments (x, y and
+                          z) and returns true if coordinate should be kept
+                          otherwise false (default = None)
+        :type predicate: function
+        :param abort: Abort iteration if boundary is crossed
+        :type abort: bool
+        """
+        self.scan = scan
+        self.minx = minx
+        self.maxx = maxx
+        self.miny = miny
+        self.maxy = maxy
+        self.minz = minz
+        self.maxz = maxz
+        self.predicate = predicate
+        self.abort = abort
+        self.aborted = False
+
+    def __iter__(self):
+        return self
+
+    def __length_hint__(self):
+        # Upper bound since points may be clipped
+        return 0 if self.aborted else _lengthhint(self.scan)
+
+    def __next__(self):
+        """Next point in iteration
+        """
+        while True:
+            if self.aborted:
+                raise StopIteration("Boundary crossed!")
+            point = next(self.scan)
+            if isinstance(point, PointBuffer3D):
+                keep = list(map(self.accept, point.xs, point.ys, point.zs))
+                if self.abort and False in keep:
+                    self.aborted = True
+                    n = keep.index(False)
+                    keep[n:] = [False] * (len(keep) - n)
+                if any(keep):
+                    return PointBuffer3D(itertools.compress(point.xs, keep),
+                                         itertools.compress(point.ys, keep),
+                                         itertools.compress(point.zs, keep),
+                                         point.xs.typecode)
+                continue
+            if self.accept(*point):
+                return point
+            if self.abort:
+                raise StopIteration("Boundary crossed!")
+
+    def accept(self, x, y, z):
+        """True if the point is kept
+        """
+        if self.predicate is not None and not self.predicate(x, y, z):
+            return False
+        return (self.minx <= x <= self.maxx and
+                self.miny <= y <= self.maxy and
+                self.minz <= z <= self.maxz)
+
+
+class scale3d(object):
+    """Scale 3D coordinates by given factor
+    """
+
+    def __init__(self, scan, sx=1, sy=1, sz=1):
+        """
+        :param scan: Voxel scan generator
+        :type scan: function
+        :param sx: x-coordinate scale factor (default=1)
+        :type sx: float
+        :param sy: y-coordinate scale factor (default=1)
+        :type sy: float
+        :param sz: z-coordinate scale factor (default=1)
+        :type sz: float
+        """
+        if sx <= 0:
+            raise ValueError("X-scale must be positive")
+        if sy <= 0:
+            raise ValueError("Y-scale must be positive")
+        if sz <= 0:
+            raise ValueError("Z-scale must be positive")
+        self.scan = scan
+        self.sx = sx
+        self.sy = sy
+        self.sz = sz
+
+    def __iter__(self):
+        return self
+
+    def __length_hint__(self):
+        return _lengthhint(self.scan)
+
+    def __next__(self):
+        """Next point in iteration
+        """
+        point = next(self.scan)
+        sx, sy, sz = self.sx, self.sy, self.sz
+        if isinstance(point, PointBuffer3D):
+            return _pointbuffer([sx * x for x in point.xs],
+                                [sy * y for y in point.ys],
+                                [sz * z for z in point.zs])
+        x, y, z = point
+        return sx * x, sy * y, sz * z
+
+
+class translation3d(object):
+    """Translate 3D coordinates by given offset
+    """
+
+    def __init__(self, scan, tx=0, ty=0, tz=0):
+        """
+        :param scan: Voxel scan generator
+        :type scan: function
+        :param tx: x-coordinate translation offset (default = 0)
+        :type tx: float
+        :param ty: y-coordinate translation offset (default = 0)
+        :type ty: float
+        :param tz: z-coordinate translation offset (default = 0)
+        :type tz: float
+        """
+        self.scan = scan
+        self.tx = tx
+        self.ty = ty
+        self.tz = tz
+
+    def __iter__(self):
+        return self
+
+    def __length_hint__(self):
+        return _lengthhint(self.scan)
+
+    def __next__(self):
+        """Next point in iteration
+        """
+        point = next(self.scan)
+        tx, ty, tz = self.tx, self.ty, self.tz
+        if isinstance(point, PointBuffer3D):
+            return _pointbuffer([x + tx for x in point.xs],
+                                [y + ty for y in point.ys],
+                                [z + tz for z in point.zs])
+        x, y, z = point
+        return x + tx, y + ty, z + tz
+
+# ======================================================================
+# 3D scan patterns
+# ----------------------------------------------------------------------
+
+
+class _VolumePattern(_ScanPattern):
+    """Base class of 3D scan patterns with a known number of voxels and
+    random access. Subclasses implement point(index).
+    """
+
+    def generate(self, start):
+        points = map(self.point, range(start, self.length))
+        if self.chunksize is not None:
+            return _chunkpoints(points, self.chunksize)
+        return points
+
+
+def _volumesize(size, distance):
+    """Validate a cube size and distance and return the power of two cube
+    side bits and the number of voxels to scan
+    """
+    if size <= 0:
+        raise ValueError("Size must be positive")
+    bits = (size - 1).bit_length()
+    if distance is None:
+        distance = 1 << (3 * bits)
+    if distance < 0 or distance > 1 << (3 * bits):
+        raise ValueError("Invalid distance!")
+    return bits, distance
+
+
+class gridscan3d(_VolumePattern):
+    """Scan voxels in a grid pattern along the x-coordinate, then
+    y-coordinate, then z-coordinate
+    """
+
+    def __init__(self, xi, yi, zi, xf, yf, zf, stepx=1, stepy=1, stepz=1,
+                 chunksize=None):
+        """
+        :param xi: Initial x-coordinate
+        :type xi: int
+        :param yi: Initial y-coordinate
+        :type yi: int
+        :param zi: Initial z-coordinate
+        :type zi: int
+        :param xf: Final x-coordinate
+        :type xf: int
+        :param yf: Final y-coordinate
+        :type yf: int
+        :param zf: Final z-coordinate
+        :type zf: int
+        :param stepx: Step size in x-coordinate
+        :type stepx: int
+        :param stepy: Step size in y-coordinate
+        :type stepy: int
+        :param stepz: Step size in z-coordinate
+        :type stepz: int
+        :param chunksize: If given, yield PointBuffer3D chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+
+        if stepx <= 0:
+            raise ValueError("X-step must be positive")
+        if stepy <= 0:
+            raise ValueError("Y-step must be positive")
+        if stepz <= 0:
+            raise ValueError("Z-step must be positive")
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        # Determine direction to move
+        dx = stepx if xf >= xi else -stepx
+        dy = stepy if yf >= yi else -stepy
+        dz = stepz if zf >= zi else -stepz
+
+        self.xs = range(xi, xf + dx, dx)
+        self.ys = range(yi, yf + dy, dy)
+        self.zs = range(zi, zf + dz, dz)
+        self.chunksize = chunksize
+        self.length = len(self.xs) * len(self.ys) * len(self.zs)
+        self.seek(0)
+
+    def point(self, index):
+        rest, i = divmod(index, len(self.xs))
+        k, j = divmod(rest, len(self.ys))
+        return self.xs[i], self.ys[j], self.zs[k]
+
+
+class hilbertscan3d(_VolumePattern):
+    """Scan voxels in a 3D Hilbert curve pattern in the first octant. The
+    curve fills a cube whose side is the size rounded up to a power of two
+    and consecutive voxels are always neighbors.
+    """
+
+    def __init__(self, size, distance=None, chunksize=None):
+        """
+        :param size: Size of enclosing cube
+        :type size: int
+        :param distance: Distance along curve (default = whole cube)
+        :type distance: int
+        :param chunksize: If given, yield PointBuffer3D chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+        self.bits, self.length = _volumesize(size, distance)
+        self.chunksize = chunksize
+        self.seek(0)
+
+    def point(self, index):
+        return hilbertaxes(index, self.bits, 3)
+
+
+class mortonscan3d(_VolumePattern):
+    """Scan voxels in a 3D Morton (Z-order) curve pattern in the first
+    octant. The curve fills a cube whose side is the size rounded up to a
+    power of two.
+    """
+
+    def __init__(self, size, distance=None, chunksize=None):
+        """
+        :param size: Size of enclosing cube
+        :type size: int
+        :param distance: Distance along curve (default = whole cube)
+        :type distance: int
+        :param chunksize: If given, yield PointBuffer3D chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+        self.bits, self.length = _volumesize(size, distance)
+        self.chunksize = chunksize
+        self.seek(0)
+
+    def point(self, index):
+        x = y = z = 0
+        for bit in range(self.bits):
+            x |= (index >> (3 * bit) & 1) << bit
+            y |= (index >> (3 * bit + 1) & 1) << bit
+            z |= (index >> (3 * bit + 2) & 1) << bit
+        return x, y, z
+
+
+class snakescan3d(_VolumePattern):
+    """Scan voxels in a snake pattern along the x-coordinate, then
+    y-coordinate, then z-coordinate. Every other slice is scanned in reverse
+    so consecutive voxels are always neighbors.
+    """
+
+    def __init__(self, xi, yi, zi, xf, yf, zf, chunksize=None):
+        """
+        :param xi: Initial x-coordinate
+        :type xi: int
+        :param yi: Initial y-coordinate
+        :type yi: int
+        :param zi: Initial z-coordinate
+        :type zi: int
+        :param xf: Final x-coordinate
+        :type xf: int
+        :param yf: Final y-coordinate
+        :type yf: int
+        :param zf: Final z-coordinate
+        :type zf: int
+        :param chunksize: If given, yield PointBuffer3D chunks of this many
+                          points instead of single points (default = None)
+        :type chunksize: int
+        """
+        if chunksize is not None and chunksize <= 0:
+            raise ValueError("Chunk size must be positive")
+
+        # Determine direction to move
+        dx = 1 if xf >= xi else -1
+        dy = 1 if yf >= yi else -1
+        dz = 1 if zf >= zi else -1
+
+        self.xs = range(xi, xf + dx, dx)
+        self.ys = range(yi, yf + dy, dy)
+        self.zs = range(zi, zf + dz, dz)
+        self.chunksize = chunksize
+        self.length = len(self.xs) * len(self.ys) * len(self.zs)
+        self.seek(0)
+
+    def point(self, index):
+        nx, ny = len(self.xs), len(self.ys)
+        k, j = divmod(index, nx * ny)
+
+        # Odd slices run the 2D snake backwards
+        if k % 2 == 1:
+            j = nx * ny - 1 - j
+        row, i = divmod(j, nx)
+        if row % 2 == 1:
+            i = nx - 1 - i
+        return self.xs[i], self.ys[row], self.zs[k]
+
+# ======================================================================
+# Image readers
+# ----------------------------------------------------------------------
+
+
+class RawImage(object):
+    """Read the pixel values of a raw image file along a scan without loading
+    the file. The file is memory mapped and the values are read a batch of
+    points at a time in file order, so each page is touched once per batch,
+    then emitted in scan order. The pages of a batch can be hinted to the
+    operating system for readahead where madvise is supported.
+    """
+
+    def __init__(self, path, width, height, dtype="B", offset=0,
+                 strides=None):
+        """
+        :param path: Raw image file path
+        :type path: str
+        :param width: Image width in pixels
+        :type width: int
+        :param height: Image height in pixels
+        :type height: int
+        :param dtype: Pixel value struct format (e.g. "B", "<H", "<f")
+                      (default = "B")
+        :type dtype: str
+        :param offset: Bytes before the first pixel (default = 0)
+        :type offset: int
+        :param strides: Bytes between rows and between pixels of a row
+                        (default = None is packed rows)
+        :type strides: tuple
+        """
+        self.format = struct.Struct(dtype)
+        if strides is None:
+            strides = (width * self.format.size, self.format.size)
+        if width <= 0 or height <= 0:
+            raise ValueError("Image size must be positive")
+        if offset < 0:
+            raise ValueError("Offset must be non-negative")
+
+        self.width = width
+        self.height = height
+        self.offset = offset
+        self.strides = tuple(strides)
+
+        # Check the last pixel is in the file before mapping it
+        last = self.byteoffset(width - 1, height - 1) + self.format.size
+        with open(path, "rb") as f:
+            f.seek(0, 2)
+            if f.tell() < last:
+                raise ValueError("File too small for image")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def advise(self, offsets):
+        """Hint the operating system to read ahead the pages holding the given
+        sorted byte offsets. Consecutive pages are advised as one range.
+        """
+        if not hasattr(self.map, "madvise"):
+            return
+        pagesize = mmap.PAGESIZE
+        start = end = None
+        for offset in offsets:
+            page = offset - offset % pagesize
+            if start is not None and page <= end:
+                end = max(end, page + pagesize)
+                continue
+            if start is not None:
+                self.map.madvise(mmap.MADV_WILLNEED, start, end - start)
+            start, end = page, page + pagesize
+        if start is not None:
+            length = min(end, len(self.map)) - start
+            self.map.madvise(mmap.MADV_WILLNEED, start, length)
+
+    def byteoffset(self, x, y):
+        """File byte offset of a pixel
+
+        :param x: x-coordinate
+        :type x: int
+        :param y: y-coordinate
+        :type y: int
+        :returns: Byte offset
+        :rtype: int
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError("Point outside image")
+        return self.offset + y * self.strides[0] + x * self.strides[1]
+
+    def close(self):
+        """Unmap the file
+        """
+        self.map.close()
+
+    def value(self, x, y):
+        """Value of a pixel
+
+        :param x: x-coordinate
+        :type x: int
+        :param y: y-coordinate
+        :type y: int
+        :returns: Pixel value
+        :rtype: int
+        """
+        return self.format.unpack_from(self.map, self.byteoffset(x, y))[0]
+
+    def values(self, scan, batchsize=4096, advise=True):
+        """Generate the pixel values along a scan in scan order. A list of
+        values is generated for each PointBuffer chunk of the scan.
+
+        :param scan: Pixel scan generator
+        :type scan: function
+        :param batchsize: Points read at a time from unchunked scans
+                          (default = 4096)
+        :type batchsize: int
+        :param advise: True to hint readahead of the pages of each batch
+                       (default = True)
+        :type advise: bool
+        """
+        if batchsize <= 0:
+            raise ValueError("Batch size must be positive")
+        scan = iter(scan)
+        for point in scan:
+            if isinstance(point, PointBuffer):
+                yield self.read(point, advise)
+                continue
+            points = [point]
+            points.extend(itertools.islice(scan, batchsize - 1))
+            for value in self.read(points, advise):
+                yield value
+
+    def read(self, points, advise=True):
+        """Values of a batch of pixels read in file order
+
+        :param points: Pixel coordinates
+        :type points: sequence
+        :param advise: True to hint readahead of the pages (default = True)
+        :type advise: bool
+        :returns: Pixel values
+        :rtype: list
+        """
+        offsets = [self.byteoffset(x, y) for x, y in points]
+        order = sorted(range(len(offsets)), key=offsets.__getitem__)
+        if advise:
+            self.advise(offsets[i] for i in order)
+        unpack, data = self.format.unpack_from, self.map
+        values = [None] * len(offsets)
+        for i in order:
+            values[i] = unpack(data, offsets[i])[0]
+        return values
+
+
+# ======================================================================
+# Scan analysis
+# ----------------------------------------------------------------------
+
+
+class LocalityReport(object):
+    """Memory locality statistics of a scan order as computed by locality.
+
+    :ivar count: Number of points inside the layout
+    :ivar outside: Number of points outside the layout (ignored)
+    :ivar jumps: Histogram of byte distances between consecutive points
+        keyed by power of two bucket (0 for repeated elements)
+    :ivar meanjump: Mean byte distance between consecutive points
+    :ivar lines: Mean and maximum distinct cache lines per window
+    :ivar pages: Mean and maximum distinct pages per window
+    :ivar misses: Number of simulated LRU cache misses
+    :ivar missrate: Ratio of cache misses to points
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.outside = 0
+        self.jumps = {}
+        self.meanjump = 0.0
+        self.lines = (0.0, 0)
+        self.pages = (0.0, 0)
+        self.misses = 0
+        self.missrate = 0.0
+
+    def __repr__(self):
+        return ("LocalityReport(count={}, meanjump={:.1f}, lines={:.1f}/{}, "
+                "pages={:.1f}/{}, misses={}, missrate={:.3f})").format(
+                    self.count, self.meanjump, self.lines[0], self.lines[1],
+                    self.pages[0], self.pages[1], self.misses, self.missrate)
+
+
+class _WindowCounter(object):
+    """Track the number of distinct keys in a sliding window.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.keys = collections.deque()
+        self.counts = {}
+        self.total = 0
+        self.windows = 0
+        self.maximum = 0
+
+    def add(self, key):
+        keys, counts = self.keys, self.counts
+        keys.append(key)
+        counts[key] = counts.get(key, 0) + 1
+        if len(keys) > self.window:
+            old = keys.popleft()
+            counts[old] -= 1
+            if counts[old] == 0:
+                del counts[old]
+        if len(keys) == self.window:
+            self.windows += 1
+            self.total += len(counts)
+            self.maximum = max(self.maximum, len(counts))
+
+    def result(self):
+        # Scans shorter than one window are measured as a single window
+        if self.windows == 0:
+            return float(len(self.counts)), len(self.counts)
+        return self.total / self.windows, self.maximum
+
+
+def locality(scan, shape, itemsize=1, linesize=64, pagesize=4096, window=64,
+             cachesize=32768):
+    """Measure the memory locality of a scan order over a row-major array.
+    Points index the array with the x-coordinate varying fastest, so 2D scans
+    map onto (height, width) arrays and 3D scans onto (depth, height, width)
+    arrays. Non-grid points are snapped to the nearest grid point as by the
+    snap transformation. Points outside the array are counted but otherwise
+    ignored.
+
+    :param scan: Pixel scan generator
+    :type scan: function
+    :param shape: Row-major array shape (slowest axis first)
+    :type shape: tuple
+    :param itemsize: Bytes per array element (default = 1)
+    :type itemsize: int
+    :param linesize: Bytes per cache line (default = 64)
+    :type linesize: int
+    :param pagesize: Bytes per memory page (default = 4096)
+    :type pagesize: int
+    :param window: Number of consecutive points per sliding window
+        (default = 64)
+    :type window: int
+    :param cachesize: Bytes of simulated LRU cache (default = 32768)
+    :type cachesize: int
+    :returns: Locality statistics
+    :rtype: LocalityReport
+    """
+
+    if min(itemsize, linesize, pagesize, window) < 1:
+        raise ValueError("Layout sizes must be positive!")
+    if cachesize < linesize:
+        raise ValueError("Cache smaller than one line!")
+
+    # Byte strides of each coordinate with the x-coordinate first
+    dims = tuple(reversed(shape))
+    strides = []
+    stride = itemsize
+    for size in dims:
+        strides.append(stride)
+        stride *= size
+
+    report = LocalityReport()
+    lines = _WindowCounter(window)
+    pages = _WindowCounter(window)
+    cache = collections.OrderedDict()
+    capacity = cachesize // linesize
+    jumps = report.jumps
+    distance = 0
+    previous = None
+
+    for point in _flatten(scan):
+        if len(point) != len(dims):
+            raise ValueError("Point and shape dimensions differ!")
+        point = [int(round(c)) for c in point]
+        if not all(0 <= c < n for c, n in zip(point, dims)):
+            report.outside += 1
+            continue
+        offset = sum(c * s for c, s in zip(point, strides))
+        report.count += 1
+
+        if previous is not None:
+            jump = abs(offset - previous)
+            bucket = 1 << (jump.bit_length() - 1) if jump else 0
+            jumps[bucket] = jumps.get(bucket, 0) + 1
+            distance += jump
+        previous = offset
+
+        line = offset // linesize
+        lines.add(line)
+        pages.add(offset // pagesize)
+        if line in cache:
+            cache.move_to_end(line)
+        else:
+            report.misses += 1
+            cache[line] = None
+            if len(cache) > capacity:
+                cache.popitem(last=False)
+
+    if report.count > 1:
+        report.meanjump = distance / (report.count - 1)
+    if report.count > 0:
+        report.missrate = report.misses / report.count
+    report.lines = lines.result()
+    report.pages = pages.result()
+    return report
+
+
+def _flatten(scan):
+    """Iterate the points of a scan whether or not it yields chunks or spans.
+    """
+    for point in scan:
+        if isinstance(point, (PointBuffer, PointBuffer3D)):
+            for item in point:
+                yield item
+        elif isinstance(point, Span):
+            for x in point.xs:
+                yield x, point.y
+        else:
+            yield point
+
+# ======================================================================
+# Scan dispatch
+# ----------------------------------------------------------------------
+
+
+class ScanDispatcher(object):
+    """Hand out batches of a scan to worker threads on demand. Workers call
+    acquire to lease the next batch and complete when it is processed.
+    Leases of workers that fail or exceed the timeout are reissued to other
+    workers. The scan is only advanced under a lock once per batch so
+    contention stays low for reasonable batch sizes. To serve worker
+    processes, register the dispatcher with a multiprocessing manager.
+    """
+
+    def __init__(self, scan, batchsize=1024, timeout=None):
+        """
+        :param scan: Pixel scan generator
+        :type scan: function
+        :param batchsize: Maximum points per batch (default = 1024)
+        :type batchsize: int
+        :param timeout: Seconds before an uncompleted lease is reissued
+                        (default = None never reissues)
+        :type timeout: float
+        """
+
+        if batchsize <= 0:
+            raise ValueError("Batch size must be positive")
+        if timeout is not None and timeout <= 0:
+            raise ValueError("Timeout must be positive")
+
+        self.points = _flatten(scan)
+        self.batchsize = batchsize
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.batches = {}
+        self.leases = {}
+        self.retry = collections.deque()
+        self.count = 0
+        self.exhausted = False
+        self.issued = 0
+        self.started = {}
+        self.stats = {}
+
+    def acquire(self, worker=None):
+        """Lease the next batch to a worker
+
+        :param worker: Worker identifier (default = None)
+        :type worker: hashable
+        :returns: Batch identifier, index of the first point in the scan and
+                  batch points, or None if no batch is available now
+        :rtype: tuple
+        """
+        with self.lock:
+            self.expire()
+            if self.retry:
+                batch = self.retry.popleft()
+            elif not self.exhausted:
+                chunk = list(itertools.islice(self.points, self.batchsize))
+                if not chunk:
+                    self.exhausted = True
+                    return None
+                batch = self.count
+                self.batches[batch] = (self.issued, _pointbuffer(*zip(*chunk)))
+                self.count += 1
+                self.issued += len(chunk)
+                self.exhausted = len(chunk) < self.batchsize
+            else:
+                return None
+            self.leases[batch] = (worker, time.monotonic())
+            self.started[batch, worker] = self.leases[batch][1]
+            start, points = self.batches[batch]
+            return batch, start, points
+
+    def complete(self, batch, worker=None):
+        """Mark a leased batch as processed by a worker. The worker is
+        credited even if its lease expired and the batch was reissued.
+        Completing a batch that was already completed by another worker is
+        ignored.
+
+        :param batch: Batch identifier
+        :type batch: int
+        :param worker: Worker identifier passed to acquire (default = None)
+        :type worker: hashable
+        :returns: True if this is the first completion of the batch
+        :rtype: bool
+        """
+        with self.lock:
+            if not 0 <= batch < self.count:
+                raise ValueError("Unknown batch!")
+            if batch not in self.batches:
+                return False
+            _, points = self.batches.pop(batch)
+            self.leases.pop(batch, None)
+            started = self.started.pop((batch, worker), None)
+            for key in [key for key in self.started if key[0] == batch]:
+                del self.started[key]
+            if started is not None:
+                stats = self.stats.setdefault(worker, [0, 0, 0.0])
+                stats[0] += 1
+                stats[1] += len(points)
+                stats[2] += time.monotonic() - started
+            if batch in self.retry:
+                self.retry.remove(batch)
+            return True
+
+    def release(self, worker):
+        """Reissue all batches leased to a worker, e.g. after it died
+
+        :param worker: Worker identifier
+        :type worker: hashable
+        :returns: Number of reissued batches
+        :rtype: int
+        """
+        with self.lock:
+            batches = [batch for batch, (owner, _) in self.leases.items()
+                       if owner == worker]
+            for batch in batches:
+                del self.leases[batch]
+                self.retry.append(batch)
+            return len(batches)
+
+    def expire(self):
+        """Reissue leases older than the timeout. Must be called with the
+        lock held.
+        """
+        if self.timeout is None:
+            return
+        now = time.monotonic()
+        for batch, (_, started) in list(self.leases.items()):
+            if now - started > self.timeout:
+                del self.leases[batch]
+                self.retry.append(batch)
+
+    @property
+    def done(self):
+        """True when the whole scan was handed out and every batch completed
+        """
+        with self.lock:
+            return self.exhausted and not self.batches
+
+    def throughput(self):
+        """Points processed per second of lease time for each worker
+
+        :returns: Worker throughputs
+        :rtype: dict
+        """
+        with self.lock:
+            return {worker: points / seconds if seconds > 0 else float("inf")
+                    for worker, (_, points, seconds) in self.stats.items()}
 
 # Following imported to support floating point bitwise operations in Python 3
 # https://code.activestate.com/recipes/577967-floating-point-bitwise-operations
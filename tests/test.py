@@ -13,8 +13,20 @@ Test the various methods to scan grid points
 
 from pixelscan.pixelscan import *
 
+import itertools
+import operator
+import os
+import pickle
+import struct
+import tempfile
+import threading
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class TestPixelscan(unittest.TestCase):
     """
@@ -22,6 +34,110 @@ class TestPixelscan(unittest.TestCase):
     point coordinates with truth coordinates.
     """
 
+    def test_batch(self):
+        truth = [[(0, 0), (1, 0), (2, 0), (0, 1)], [(1, 1), (2, 1), (0, 2),
+                 (1, 2)], [(2, 2)]]
+        x0, y0, x1, y1 = 0, 0, 2, 2
+        batches = batch(gridscan(x0, y0, x1, y1), 4)
+        self.assertEqual(operator.length_hint(batches), 3)
+        for index, points in enumerate(batches):
+            self.assertIsInstance(points, PointBuffer)
+            self.assertEqual(points.tolist(), truth[index])
+        self.assertEqual(index+1, len(truth))
+        mask = [[1, 1, 1], [1, 1, 1], [1, 1, 1]]
+        batches = batch(maskscan(mask, chunksize=2), 4, output="list")
+        for index, points in enumerate(batches):
+            self.assertEqual(points, truth[index])
+        self.assertEqual(index+1, len(truth))
+
+    def test_batch_transformations(self):
+        width, height = 7, 5
+
+        def pipeline(scan):
+            scan = skip(scan, start=1, stop=30, step=2)
+            scan = sample(scan, probability=0.8, seed=0)
+            scan = snap(rotation(scale(scan, sx=2, sy=3), angle=90))
+            scan = clip(swap(reflection(scan, rx=True)), maxy=8)
+            return translation(scan, tx=1, ty=-1)
+
+        points = list(pipeline(gilbertscan(width, height)))
+        batches = list(pipeline(batch(gilbertscan(width, height), 6)))
+        for points2 in batches:
+            self.assertIsInstance(points2, PointBuffer)
+        self.assertEqual(sum([p.tolist() for p in batches], []), points)
+
+    def test_batch_outputs(self):
+        transformations = [lambda scan: clip(scan, minx=1, predicate=lambda
+                                             x, y: x != y),
+                           lambda scan: reflection(scan, rx=True),
+                           lambda scan: rotation(scan, angle=90),
+                           lambda scan: sample(scan, 0.5, seed=0),
+                           lambda scan: scale(scan, sx=2),
+                           lambda scan: skip(scan, start=1, step=2),
+                           lambda scan: snap(scale(scan, sx=0.5)),
+                           swap,
+                           lambda scan: translation(scan, tx=1, ty=2),
+                           unique]
+        outputs = ["buffer", "list"] + (["numpy"] if numpy else [])
+        for transformation in transformations:
+            truth = list(transformation(gridscan(0, 0, 2, 2)))
+            for output in outputs:
+                for size in (2, 4):
+                    batches = list(transformation(batch(gridscan(0, 0, 2, 2),
+                                                        size, output)))
+                    points = []
+                    for points2 in batches:
+                        if output == "buffer":
+                            self.assertIsInstance(points2, PointBuffer)
+                            points2 = points2.tolist()
+                        elif output == "list":
+                            self.assertIsInstance(points2, list)
+                        else:
+                            self.assertEqual(points2.shape[1], 2)
+                            points2 = [tuple(p) for p in points2.tolist()]
+                        points.extend(points2)
+                    self.assertEqual(points, truth)
+
+    def test_checkpoint_seek(self):
+        mask = [[0, 1, 1, 1], [1, 1, 1, 0], [0, 1, 1, 1]]
+        region = Region.ring(0, 0, 1, 2) - Region.rectangle(0, 0, 2, 2)
+        centers = [(0, 0), (4, 1)]
+        patterns = [lambda: circlescan(0, 0, 0, 3),
+                    lambda: floodscan(1, 1, mask),
+                    lambda: floodscan(1, 1, mask, order="bfs"),
+                    lambda: gilbertscan(5, 3),
+                    lambda: gridscan(0, 0, 4, 3),
+                    lambda: hilbertscan(8, 64),
+                    lambda: interlacescan(0, 0, 7, 5),
+                    lambda: maskscan(mask, chunksize=2),
+                    lambda: multicirclescan(centers, 0, 2),
+                    lambda: multiringscan(centers, 1, 2, minx=0, maxx=4,
+                                          miny=0, maxy=4),
+                    lambda: permutescan(0, 0, 4, 3, seed=0),
+                    lambda: quasiscan(0, 0, 9, 9, 20, seed=0),
+                    lambda: regionscan(region, order="snake"),
+                    lambda: ringscan(0, 0, 0, 3),
+                    lambda: ringscan(0, 0, 3, 1, metric=manhattan),
+                    lambda: ringscan(0, 0, 0, 3, metric=euclidean),
+                    lambda: rotatescan(0, 0, 5, 4, angle=30),
+                    lambda: snakescan(0, 0, 4, 3),
+                    lambda: walkscan(0, 0, seed=0),
+                    lambda: walkscan(0, 0, chunksize=3, seed=0),
+                    lambda: gridscan3d(0, 0, 0, 2, 2, 2),
+                    lambda: hilbertscan3d(4),
+                    lambda: mortonscan3d(4),
+                    lambda: snakescan3d(0, 0, 0, 2, 2, 2)]
+        for pattern in patterns:
+            for start in (0, 3, 10):
+                for before, after in ((0, 0), (5, 0), (5, 2)):
+                    points = pattern()
+                    list(itertools.islice(points, before))
+                    points.seek(start)
+                    list(itertools.islice(points, after))
+                    restored = pickle.loads(pickle.dumps(points))
+                    self.assertEqual(list(itertools.islice(restored, 20)),
+                                     list(itertools.islice(points, 20)))
+
     def test_circlescan(self):
         truth = [(0, 0), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1),
                  (-1, 0), (-1, 1), (0, 2), (1, 2), (2, 1), (2, 0), (2, -1),
@@ -33,6 +149,15 @@ class TestPixelscan(unittest.TestCase):
             self.assertEqual(point, truth[index])
         self.assertEqual(index+1, len(truth))
 
+    def test_circlescan_checkpoint(self):
+        x0, y0, r1, r2 = 0, 0, 0, 4
+        points = snap(circlescan(x0, y0, r1, r2))
+        truth = list(snap(circlescan(x0, y0, r1, r2)))
+        for index in range(30):
+            next(points)
+        points = pickle.loads(pickle.dumps(points))
+        self.assertEqual(list(points), truth[30:])
+
     def test_circlescan_skip(self):
         truth = [(0, 0), (1, 1), (1, -1), (-1, -1), (-1, 1), (1, 2), (2, 0),
                  (1, -2), (-1, -2), (-2, 0), (-1, 2)]
@@ -75,6 +200,21 @@ class TestPixelscan(unittest.TestCase):
             self.assertEqual(point, truth[index])
         self.assertEqual(index+1, len(truth))
 
+    def test_gridscan_select(self):
+        x0, y0, x1, y1 = 0, 0, 9, 9
+        pixels = list(gridscan(x0, y0, x1, y1))
+        for npoints in (3, 60, 100):
+            points = list(select(gridscan(x0, y0, x1, y1), npoints, seed=0))
+            self.assertEqual(len(points), npoints)
+            self.assertEqual(len(set(points)), npoints)
+            self.assertTrue(set(points) <= set(pixels))
+            scan = gridscan(x0, y0, x1, y1)
+            ordered = list(select(scan, npoints, ordered=True, seed=0))
+            self.assertEqual(ordered, sorted(points, key=pixels.index))
+        self.assertRaises(ValueError, select, gridscan(x0, y0, x1, y1), 101)
+        self.assertRaises(TypeError, select, walkscan(x0, y0), 1)
+        self.assertRaises(TypeError, select, maskscan([[1, 1], [1, 1]]), 2)
+
     def test_gridscan_skip(self):
         truth = [(1, 0), (0, 1)]
         x0, y0, x1, y1 = 0, 0, 2, 2
@@ -91,6 +231,183 @@ class TestPixelscan(unittest.TestCase):
             self.assertEqual(point, truth[index])
         self.assertEqual(index+1, len(truth))
 
+    def test_gridscan_spans(self):
+        truth = [Span(0, 4, 0, -1), Span(1, 4, 0, -1)]
+        for index, span in enumerate(gridscan(4, 0, 0, 1).spans()):
+            self.assertEqual(span, truth[index])
+        self.assertEqual(index+1, len(truth))
+        spans = list(gridscan(0, 0, 4, 1, stepx=2).spans())
+        self.assertEqual(len(spans), 6)
+        self.assertEqual(list(batch(iter(spans), 6, output="list"))[0],
+                         list(gridscan(0, 0, 4, 1, stepx=2)))
+
+    def test_gridscan_checkpoint(self):
+        x0, y0, x1, y1 = 0, 0, 2, 2
+        points = skip(gridscan(x0, y0, x1, y1), step=2)
+        truth = list(skip(gridscan(x0, y0, x1, y1), step=2))
+        next(points)
+        next(points)
+        checkpoint = pickle.dumps(points)
+        self.assertEqual(list(points), truth[2:])
+        self.assertEqual(list(pickle.loads(checkpoint)), truth[2:])
+
+    def test_gridscan_index_of(self):
+        x0, y0, x1, y1 = 0, 3, 4, 0
+        points = list(gridscan(x0, y0, x1, y1, stepx=2))
+        scan = gridscan(x0, y0, x1, y1, stepx=2)
+        for index, point in enumerate(points):
+            self.assertEqual(scan.index_of(*point), index)
+        xs, ys = zip(*points)
+        self.assertEqual(list(scan.indices_of(xs, ys)),
+                         list(range(len(points))))
+        self.assertRaises(ValueError, scan.index_of, 1, 0)
+        self.assertRaises(ValueError, scan.indices_of, [0, 1], [0, 0])
+
+    def test_gridscan_length_hint(self):
+        x0, y0, x1, y1 = 0, 0, 4, 3
+        points = gridscan(x0, y0, x1, y1)
+        self.assertEqual(operator.length_hint(points), 20)
+        next(points)
+        self.assertEqual(operator.length_hint(points), 19)
+        points = skip(translation(snap(gridscan(x0, y0, x1, y1)), tx=1),
+                      start=2, stop=15, step=3)
+        self.assertEqual(operator.length_hint(points), 5)
+        next(points)
+        self.assertEqual(operator.length_hint(points), 4)
+        self.assertEqual(len(list(points)), 4)
+        points = sample(gridscan(x0, y0, x1, y1), probability=0.5)
+        self.assertEqual(operator.length_hint(points), 10)
+
+    def test_dispatcher(self):
+        x0, y0, x1, y1 = 0, 0, 2, 1
+        dispatcher = ScanDispatcher(gridscan(x0, y0, x1, y1), batchsize=4)
+        batch1, start1, points1 = dispatcher.acquire("a")
+        batch2, start2, points2 = dispatcher.acquire("b")
+        self.assertEqual((start1, points1.tolist()),
+                         (0, [(0, 0), (1, 0), (2, 0), (0, 1)]))
+        self.assertEqual((start2, points2.tolist()), (4, [(1, 1), (2, 1)]))
+        self.assertIsNone(dispatcher.acquire("a"))
+        self.assertTrue(dispatcher.complete(batch2, "b"))
+        self.assertEqual(dispatcher.release("a"), 1)
+        self.assertEqual(dispatcher.acquire("c"), (batch1, start1, points1))
+        self.assertFalse(dispatcher.done)
+        self.assertTrue(dispatcher.complete(batch1, "c"))
+        self.assertFalse(dispatcher.complete(batch1, "a"))
+        self.assertTrue(dispatcher.done)
+        self.assertEqual(sorted(dispatcher.throughput()), ["b", "c"])
+        self.assertEqual(dispatcher.stats["c"][:2], [1, 4])
+        dispatcher = ScanDispatcher(gridscan(x0, y0, x1, y1), batchsize=6)
+        batch1, _, _ = dispatcher.acquire("a")
+        dispatcher.release("a")
+        self.assertEqual(dispatcher.acquire("b")[0], batch1)
+        self.assertTrue(dispatcher.complete(batch1, "a"))
+        self.assertEqual(list(dispatcher.stats), ["a"])
+        self.assertEqual(dispatcher.stats["a"][:2], [1, 6])
+        self.assertFalse(dispatcher.complete(batch1, "b"))
+        self.assertEqual(list(dispatcher.stats), ["a"])
+
+    def test_dispatcher_threads(self):
+        x0, y0, x1, y1 = 0, 0, 49, 49
+        dispatcher = ScanDispatcher(gridscan(x0, y0, x1, y1), batchsize=7)
+        points = []
+
+        def work(worker):
+            while True:
+                lease = dispatcher.acquire(worker)
+                if lease is None:
+                    return
+                points.extend(lease[2])
+                dispatcher.complete(lease[0], worker)
+
+        threads = [threading.Thread(target=work, args=(worker,))
+                   for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(dispatcher.done)
+        self.assertEqual(sorted(points),
+                         sorted(gridscan(x0, y0, x1, y1)))
+
+    def test_floodscan(self):
+        truth = [(0, 0), (1, 0), (1, 1), (2, 1), (2, 2), (1, 3), (2, 3)]
+        mask = [[1, 1, 0], [0, 1, 1], [1, 0, 1], [0, 1, 1]]
+        points = floodscan(0, 0, mask)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+        points = list(floodscan(0, 0, mask, connectivity=8))
+        self.assertEqual(sorted(points), sorted(truth + [(0, 2)]))
+        self.assertEqual(list(floodscan(2, 0, mask)), [])
+
+    def test_floodscan_bfs(self):
+        x0, y0, r = 5, 5, 3
+        for metric, connectivity in ((manhattan, 4), (chebyshev, 8)):
+            points = list(floodscan(x0, y0, lambda x, y: True, connectivity,
+                                    order="bfs", minx=x0-r, maxx=x0+r,
+                                    miny=y0-r, maxy=y0+r))
+            self.assertEqual(len(points), len(set(points)))
+            self.assertEqual(len(points), (2*r+1)**2)
+            distances = [metric((x0, y0), point) for point in points]
+            self.assertEqual(distances, sorted(distances))
+        chunks = floodscan(x0, y0, lambda x, y: abs(x - x0) < 3 > abs(y - y0),
+                           order="bfs", chunksize=10)
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+
+    def test_gilbertscan(self):
+        truth = [(0, 0), (0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (1, 1),
+                 (1, 0), (2, 0)]
+        width, height = 3, 3
+        points = gilbertscan(width, height)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+        width, height = 11, 6
+        points = list(gilbertscan(width, height))
+        pixels = set(gridscan(0, 0, width-1, height-1))
+        self.assertEqual(len(points), width*height)
+        self.assertEqual(set(points), pixels)
+        for point1, point2 in zip(points, points[1:]):
+            self.assertEqual(chebyshev(point1, point2), 1)
+        points2 = gilbertscan(width, height)
+        self.assertEqual([points2[i] for i in range(width*height)], points)
+
+    def test_gilbertscan_chunks(self):
+        width, height = 6, 11
+        points = list(gilbertscan(width, height))
+        chunks = gilbertscan(width, height, chunksize=8)
+        chunks.seek(5)
+        chunks = list(chunks)
+        self.assertEqual([len(chunk) for chunk in chunks], [8]*7 + [5])
+        self.assertEqual(sum([chunk.tolist() for chunk in chunks], []),
+                         points[5:])
+
+    def test_gridscan3d(self):
+        truth = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0), (0, 0, 1),
+                 (1, 0, 1), (0, 1, 1), (1, 1, 1)]
+        x0, y0, z0, x1, y1, z1 = 0, 0, 0, 1, 1, 1
+        points = gridscan3d(x0, y0, z0, x1, y1, z1)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+        points = gridscan3d(x0, y0, z0, x1, y1, z1)
+        self.assertEqual([points[i] for i in range(8)], truth)
+        self.assertEqual(points[-1], truth[-1])
+
+    def test_gridscan3d_chunks(self):
+        truth = [[(1, 0, 2), (3, 0, 2), (1, 1, 2)], [(3, 1, 2)]]
+        x0, y0, z0, x1, y1, z1 = 0, 0, 0, 1, 1, 1
+        chunks = clip3d(translation3d(scale3d(gridscan3d(x0, y0, z0,
+                                                         x1, y1, z1,
+                                                         chunksize=3),
+                                              sx=2),
+                                      tx=1, tz=2),
+                        maxz=2)
+        for index, chunk in enumerate(chunks):
+            self.assertIsInstance(chunk, PointBuffer3D)
+            self.assertEqual(chunk.tolist(), truth[index])
+        self.assertEqual(index+1, len(truth))
+
     def test_hilbertscan(self):
         truth = [(0, 0), (0, 1), (1, 1), (1, 0), (2, 0), (3, 0), (3, 1),
                  (2, 1), (2, 2), (3, 2), (3, 3), (2, 3), (1, 3), (1, 2),
@@ -101,6 +418,408 @@ class TestPixelscan(unittest.TestCase):
             self.assertEqual(point, truth[index])
         self.assertEqual(index+1, len(truth))
 
+    def test_hilbertscan_index_of(self):
+        size, distance = 4, 60
+        points = list(hilbertscan(size, distance))
+        scan = hilbertscan(size, distance)
+        for index, point in enumerate(points):
+            self.assertEqual(scan.index_of(*point), index)
+        self.assertEqual(hilbertxy2d(8, 3, 1), 6)
+        self.assertRaises(ValueError, scan.index_of, 8, 0)
+        self.assertRaises(ValueError, scan.index_of, 7, 0)
+
+    def test_hilbertscan3d(self):
+        truth = [(0, 0, 0), (0, 0, 1), (0, 1, 1), (0, 1, 0), (1, 1, 0),
+                 (1, 1, 1), (1, 0, 1), (1, 0, 0)]
+        points = hilbertscan3d(2)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+        points = list(hilbertscan3d(4))
+        self.assertEqual(len(set(points)), 64)
+        for point1, point2 in zip(points, points[1:]):
+            self.assertEqual(sum(abs(a - b) for a, b in zip(point1, point2)),
+                             1)
+        self.assertEqual(hilbertscan3d(4)[37], points[37])
+
+    def test_interlacescan(self):
+        truth = [(0, 0), (2, 0), (0, 2), (2, 2), (1, 0), (3, 0), (1, 2),
+                 (3, 2), (0, 1), (1, 1), (2, 1), (3, 1), (0, 3), (1, 3),
+                 (2, 3), (3, 3)]
+        x0, y0, x1, y1 = 0, 0, 3, 3
+        points = interlacescan(x0, y0, x1, y1, levels=1)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+        self.assertEqual(points.passcounts, [4, 4, 8])
+        self.assertEqual(points.levelcounts, [4, 16])
+        self.assertEqual([points[i] for i in range(len(truth))], truth)
+        self.assertEqual([points.index_of(*p) for p in truth],
+                         list(range(len(truth))))
+
+    def test_interlacescan_adam7(self):
+        x0, y0, x1, y1 = 0, 0, 9, 8
+        points = interlacescan(x0, y0, x1, y1, chunksize=16)
+        self.assertEqual(points.passcounts, [4, 2, 3, 6, 10, 25, 40])
+        self.assertEqual(points.levelcounts, [4, 9, 25, 90])
+        points = sum([chunk.tolist() for chunk in points], [])
+        self.assertEqual(points[:6], [(0, 0), (8, 0), (0, 8), (8, 8),
+                                      (4, 0), (4, 8)])
+        self.assertEqual(sorted(points), sorted(gridscan(x0, y0, x1, y1)))
+
+    def test_locality(self):
+        x0, y0, x1, y1 = 0, 0, 3, 1
+        report = locality(snakescan(x0, y0, x1, y1), shape=(2, 4),
+                          linesize=4, pagesize=8, window=2, cachesize=4)
+        self.assertEqual(report.count, 8)
+        self.assertEqual(report.jumps, {1: 6, 4: 1})
+        self.assertEqual(report.lines, (8 / 7, 2))
+        self.assertEqual(report.pages, (1.0, 1))
+        self.assertEqual(report.misses, 2)
+        report = locality(gridscan(-1, 0, 1, 0), shape=(1, 2))
+        self.assertEqual((report.count, report.outside), (2, 1))
+        report = locality(circlescan(5, 5, 0, 2), shape=(12, 12))
+        truth = locality(snap(circlescan(5, 5, 0, 2)), shape=(12, 12))
+        self.assertEqual((report.count, report.jumps), (21, truth.jumps))
+
+    def test_maskscan(self):
+        mask = [[0, 1, 1],
+                [1, 0, 1],
+                [0, 0, 0],
+                [1, 1, 0]]
+        truth = [(1, 0), (2, 0), (0, 1), (2, 1), (0, 3), (1, 3)]
+        points = maskscan(mask)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+
+    def test_maskscan_snake(self):
+        mask = b"\x00\x01\x01\x01\x00\x01\x00\x00\x00\x01\x01\x00"
+        truth = [(1, 0), (2, 0), (2, 1), (0, 1), (1, 3), (0, 3)]
+        points = maskscan(mask, order="snake", width=3)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+
+    def test_maskscan_chunks(self):
+        mask = RunLengthMask([[0, 1, 1], [1, 1, 1], [0, 0, 1]])
+        self.assertEqual(mask.runs, [[(1, 2)], [(0, 2)], [(2, 2)]])
+        self.assertEqual(mask.count, 6)
+        truth = [[(1, 0), (2, 0), (2, 1), (1, 1)], [(0, 1), (2, 2)]]
+        chunks = maskscan(mask, order="snake", chunksize=4)
+        for index, chunk in enumerate(chunks):
+            self.assertIsInstance(chunk, PointBuffer)
+            self.assertEqual(chunk.tolist(), truth[index])
+        self.assertEqual(index+1, len(truth))
+        points = [point for point in maskscan(mask, order="snake")]
+        self.assertEqual(points, truth[0] + truth[1])
+
+    def test_maskscan_clip_vectorized(self):
+        def predicate(xs, ys):
+            return [x + y >= 2 for x, y in zip(xs, ys)]
+        mask = [[1, 1, 1], [1, 1, 1], [1, 1, 1]]
+        truth = [[(2, 0)], [(1, 1), (2, 1)]]
+        chunks = clip(maskscan(mask, chunksize=4), maxy=1,
+                      predicate=predicate, vectorized=True)
+        for index, chunk in enumerate(chunks):
+            self.assertEqual(chunk.tolist(), truth[index])
+        self.assertEqual(index+1, len(truth))
+
+    def test_clip_vectorized_arrays(self):
+        types = []
+
+        def predicate(xs, ys):
+            types.append((type(xs), type(ys)))
+            return [x + y >= 2 for x, y in zip(xs, ys)]
+        array = numpy.ndarray if numpy else type(PointBuffer().xs)
+        scan = maskscan([[1, 1, 1], [1, 1, 1]], chunksize=4)
+        chunks = clip(scan, predicate=predicate, vectorized=True)
+        self.assertEqual([chunk.tolist() for chunk in chunks],
+                         [[(2, 0)], [(1, 1), (2, 1)]])
+        spans = list(clip(gridscan(0, 0, 2, 1).spans(), predicate=predicate,
+                          vectorized=True))
+        self.assertEqual(spans, [Span(0, 2, 2, 1), Span(1, 1, 2, 1)])
+        self.assertEqual(set(types), {(array, array)})
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_clip_vectorized_numpy(self):
+        def predicate(xs, ys):
+            return xs + ys >= 2
+        chunks = clip(maskscan([[1, 1, 1], [1, 1, 1]], chunksize=4),
+                      predicate=predicate, vectorized=True)
+        self.assertEqual([chunk.tolist() for chunk in chunks],
+                         [[(2, 0)], [(1, 1), (2, 1)]])
+        spans = clip(gridscan(0, 0, 2, 1).spans(), predicate=predicate,
+                     vectorized=True)
+        self.assertEqual(list(spans), [Span(0, 2, 2, 1), Span(1, 1, 2, 1)])
+
+    def test_maskscan_clip_abort(self):
+        mask = [[1, 1, 1], [1, 1, 1], [1, 1, 1]]
+        truth = [[(0, 0), (1, 0), (2, 0), (0, 1)], [(1, 1)]]
+        chunks = clip(maskscan(mask, chunksize=4),
+                      predicate=lambda x, y: x + y < 3, abort=True)
+        for index, chunk in enumerate(chunks):
+            self.assertEqual(chunk.tolist(), truth[index])
+        self.assertEqual(index+1, len(truth))
+
+    def test_multicirclescan(self):
+        centers = [(0, 0), (5, 1)]
+        truth = list(circlescan(0, 0, 1, 2)) + list(circlescan(5, 1, 1, 2))
+        points = multicirclescan(centers, 1, 2)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+
+    def test_multiringscan(self):
+        centers = [(0, 0), (3, 9), (9, 4)]
+        truth = [point for x0, y0 in centers
+                 for point in ringscan(x0, y0, 0, 1, manhattan)
+                 if 0 <= point[0] <= 9 and 0 <= point[1] <= 9]
+        points = multiringscan(centers, 0, 1, manhattan, minx=0, maxx=9,
+                               miny=0, maxy=9)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+        chunks = list(multiringscan(centers, 0, 1, manhattan, minx=0, maxx=9,
+                                    miny=0, maxy=9, chunksize=4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 3])
+        points = multiringscan(centers, 0, 1, manhattan)
+        self.assertEqual(points[7], (4, 9))
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_multiringscan_asarray(self):
+        centers = numpy.array([(0, 0), (3, 9), (9, 4)])
+        points = multiringscan(centers, 0, 1, manhattan).asarray()
+        self.assertEqual(points.shape, (3, 5, 2))
+        self.assertEqual(points.reshape(-1, 2).tolist(),
+                         [list(point) for point in
+                          multiringscan(centers, 0, 1, manhattan)])
+        clipped = multiringscan(centers, 0, 1, manhattan, minx=0, maxx=9,
+                                miny=0, maxy=9).asarray()
+        self.assertEqual(clipped.shape, (3, 5, 2))
+        self.assertEqual(clipped.mask[..., 0].sum(), 4)
+        self.assertEqual(clipped.compressed().reshape(-1, 2).tolist(),
+                         [list(point) for point in
+                          multiringscan(centers, 0, 1, manhattan, minx=0,
+                                        maxx=9, miny=0, maxy=9)])
+
+    def test_permutescan(self):
+        x0, y0, x1, y1 = 0, 0, 6, 4
+        pixels = sorted(gridscan(x0, y0, x1, y1))
+        points = list(permutescan(x0, y0, x1, y1, seed=1))
+        self.assertEqual(sorted(points), pixels)
+        self.assertNotEqual(points, list(gridscan(x0, y0, x1, y1)))
+        self.assertEqual(points, list(permutescan(x0, y0, x1, y1, seed=1)))
+        scan = permutescan(x0, y0, x1, y1, seed=1)
+        self.assertEqual([scan[i] for i in range(len(points))], points)
+        self.assertEqual([scan.index_of(*p) for p in points],
+                         list(range(len(points))))
+
+    def test_permutescan_shards(self):
+        x0, y0, x1, y1 = 0, 0, 6, 4
+        points = list(permutescan(x0, y0, x1, y1, seed=2))
+        shards = [permutescan(x0, y0, x1, y1, seed=2, shard=shard,
+                              nshards=3, chunksize=4) for shard in range(3)]
+        self.assertEqual([shard.length for shard in shards], [12, 12, 11])
+        for shard, scan in enumerate(shards):
+            scan = sum([chunk.tolist() for chunk in scan], [])
+            self.assertEqual(scan, points[shard::3])
+        self.assertRaises(ValueError, shards[1].index_of, *points[0])
+
+    def test_prefetch(self):
+        truth = list(hilbertscan(16, 256))
+        prefetched = prefetch(hilbertscan(16, 256), batches=2, batchsize=10)
+        for index, point in enumerate(prefetched):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+        self.assertEqual(prefetched.fetched, 27)
+        self.assertLessEqual(prefetched.maxdepth, 2)
+        self.assertFalse(prefetched.worker.is_alive())
+
+    def test_prefetch_exception(self):
+        def scan():
+            yield (0, 0)
+            raise KeyError("scan")
+        prefetched = prefetch(scan(), batchsize=1)
+        self.assertEqual(next(prefetched), (0, 0))
+        self.assertRaises(KeyError, next, prefetched)
+        self.assertRaises(StopIteration, next, prefetched)
+
+        def interrupted():
+            yield (0, 0)
+            raise SystemExit
+        prefetched = prefetch(interrupted(), batchsize=1)
+        self.assertEqual(next(prefetched), (0, 0))
+        self.assertRaises(SystemExit, next, prefetched)
+
+    def test_prefetch_process(self):
+        truth = list(hilbertscan(16, 256))
+        prefetched = prefetch(hilbertscan(16, 256), batchsize=10, process=True)
+        self.assertEqual(list(prefetched), truth)
+        self.assertFalse(prefetched.worker.is_alive())
+        prefetched = prefetch(walkscan(0, 0, seed=0), batches=1, process=True)
+        next(prefetched)
+        prefetched.worker.terminate()
+        prefetched.worker.join()
+        self.assertRaises(RuntimeError, list, prefetched)
+
+    def test_prefetch_close(self):
+        with prefetch(walkscan(0, 0, seed=0), batches=2) as prefetched:
+            truth = list(itertools.islice(walkscan(0, 0, seed=0), 5))
+            self.assertEqual([next(prefetched) for _ in truth], truth)
+        self.assertFalse(prefetched.worker.is_alive())
+        self.assertRaises(StopIteration, next, prefetched)
+
+    def test_quasiscan(self):
+        truth = {"halton": [(0, 0), (2, 1), (1, 2), (3, 0), (0, 1)],
+                 "sobol": [(0, 0), (2, 2), (3, 1), (1, 3), (1, 1)],
+                 "r2": [(2, 2), (1, 0), (0, 2), (3, 0), (2, 3)]}
+        x0, y0, x1, y1, n = 0, 0, 3, 3, 5
+        for sequence in quasiscan.SEQUENCES:
+            points = quasiscan(x0, y0, x1, y1, n, sequence=sequence)
+            for index, point in enumerate(points):
+                self.assertEqual(point, truth[sequence][index])
+            self.assertEqual(index+1, len(truth[sequence]))
+
+    def test_quasiscan_unique(self):
+        x0, y0, x1, y1 = 0, 0, 9, 6
+        pixels = sorted(gridscan(x0, y0, x1, y1))
+        for sequence in quasiscan.SEQUENCES:
+            points = list(quasiscan(x0, y0, x1, y1, len(pixels),
+                                    sequence=sequence, scramble=True, seed=1))
+            self.assertEqual(sorted(points), pixels)
+            chunks = quasiscan(x0, y0, x1, y1, 30, sequence=sequence,
+                               scramble=True, seed=1, chunksize=8)
+            self.assertEqual([len(chunk) for chunk in chunks], [8, 8, 8, 6])
+            self.assertEqual(sum([c.tolist() for c in chunks], []), [])
+            chunks.seek(0)
+            self.assertEqual(sum([c.tolist() for c in chunks], []),
+                             points[:30])
+        self.assertRaises(ValueError, quasiscan, x0, y0, x1, y1, 71)
+
+    def test_quasiscan_limits(self):
+        x0, y0, x1, y1 = 0, 0, 1 << 16, 1 << 16
+        for sequence in quasiscan.SEQUENCES:
+            self.assertRaises(ValueError, quasiscan, x0, y0, x1, y1, 1 << 32,
+                              sequence=sequence)
+            points = quasiscan(0, 0, 3, 3, 5, sequence=sequence)
+            self.assertRaises(ValueError, points.seek, 1 << 32)
+            self.assertRaises(ValueError, points.seek, 1 << 64)
+
+    def test_ringscan_checkpoint(self):
+        x0, y0, r1, r2 = 0, 0, 0, 2
+        truth = list(ringscan(x0, y0, r1, r2, metric=manhattan))
+        for index in range(len(truth)):
+            points = ringscan(x0, y0, r1, r2, metric=manhattan)
+            for count in range(index):
+                next(points)
+            points = pickle.loads(pickle.dumps(points))
+            self.assertEqual(list(points), truth[index:])
+
+    def test_ringscan_index_of(self):
+        x0, y0, r1, r2 = 1, -1, 3, 0
+        for metric in (chebyshev, manhattan):
+            points = list(ringscan(x0, y0, r1, r2, metric=metric))
+            scan = ringscan(x0, y0, r1, r2, metric=metric)
+            for index, point in enumerate(points):
+                self.assertEqual(scan.index_of(*point), index)
+            self.assertRaises(ValueError, scan.index_of, x0 + 4, y0)
+        scan = ringscan(x0, y0, r1, r2, metric=lambda p1, p2: 0)
+        self.assertRaises(TypeError, scan.index_of, x0, y0)
+
+    def test_ringscan_random_access(self):
+        x0, y0, r1, r2 = 1, -1, 3, 0
+        for metric in (chebyshev, manhattan):
+            points = list(ringscan(x0, y0, r1, r2, metric=metric))
+            scan = ringscan(x0, y0, r1, r2, metric=metric)
+            self.assertEqual([scan[i] for i in range(len(points))], points)
+            self.assertEqual(scan[-1], points[-1])
+        scan = ringscan(x0, y0, r1, r2, metric=lambda p1, p2: 0)
+        self.assertRaises(TypeError, scan.__getitem__, 0)
+
+    def test_ringscan_length_hint(self):
+        x0, y0, r1, r2 = 0, 0, 0, 2
+        points = ringscan(x0, y0, r1, r2, metric=chebyshev)
+        self.assertEqual(operator.length_hint(points), 25)
+        points = ringscan(x0, y0, r2, r1, metric=manhattan)
+        self.assertEqual(operator.length_hint(points), 13)
+        points = skip(walkscan(x0, y0), stop=8)
+        self.assertEqual(operator.length_hint(points), 9)
+
+    def test_rawimage(self):
+        width, height = 5, 4
+        rows = [[10 * y + x for x in range(width)] for y in range(height)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "image.raw")
+            with open(path, "wb") as f:
+                f.write(b"header")
+                for row in rows:
+                    f.write(struct.pack("<5H", *row) + b"pad")
+            strides = (2 * width + 3, 2)
+            with RawImage(path, width, height, "<H", offset=6,
+                          strides=strides) as image:
+                points = list(snakescan(0, 0, width-1, height-1))
+                values = list(image.values(iter(points), batchsize=3))
+                self.assertEqual(values, [rows[y][x] for x, y in points])
+                mask = [[1, 0, 1], [0, 1, 0]]
+                chunks = list(image.values(maskscan(mask, chunksize=2)))
+                self.assertEqual(chunks, [[0, 2], [11]])
+                self.assertRaises(IndexError, image.value, width, 0)
+            self.assertRaises(ValueError, RawImage, path, width, height + 1,
+                              "<H", offset=6, strides=strides)
+
+    def test_region(self):
+        ring = Region.ring(0, 0, 1, 2)
+        square = Region.rectangle(-1, -1, 2, 2)
+        self.assertEqual(len(ring), 24)
+        self.assertEqual(len(ring | square), 25)
+        self.assertEqual(len(ring & square), 15)
+        self.assertEqual(len(ring - square), 9)
+        self.assertEqual((ring - square).rows[-1], [(-2, -2)])
+        self.assertEqual(ring | square, square | ring)
+        self.assertEqual(Region.polygon([(-1, -1), (3, -1), (3, 3), (-1, 3)]),
+                         square)
+        self.assertEqual(Region.fromscan(ringscan(0, 0, 1, 2)), ring)
+        self.assertEqual(Region.mask([[1, 1, 0], [0, 1, 1]]).rows,
+                         {0: [(0, 1)], 1: [(1, 2)]})
+        self.assertIn((2, 2), ring)
+        self.assertNotIn((0, 0), ring)
+
+    def test_regionscan(self):
+        truth = [(0, 0), (1, 0), (2, 0), (3, 0), (3, 1), (0, 1), (0, 2),
+                 (1, 2), (2, 2), (3, 2)]
+        region = Region.rectangle(0, 0, 3, 2) - Region.rectangle(1, 1, 2, 1)
+        points = regionscan(region, order="snake")
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+            self.assertEqual(points.point(index), point)
+            self.assertEqual(points.index_of(*point), index)
+        self.assertEqual(index+1, len(truth))
+        chunks = list(regionscan(region, chunksize=4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+
+    def test_reorder(self):
+        truth = [(0, 0), (1, 0), (2, 1), (4, 0), (4, 4), (0, 4)]
+        points = [(0, 0), (4, 4), (1, 0), (0, 4), (2, 1), (4, 0)]
+        reordered = reorder(iter(points), metric=chebyshev)
+        for index, point in enumerate(reordered):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+        self.assertEqual((reordered.before, reordered.after), (17, 12))
+
+    def test_reorder_strategies(self):
+        x0, y0, x1, y1 = 0, 0, 99, 99
+        points = list(select(gridscan(x0, y0, x1, y1), 500, seed=0))
+        for strategy in reorder.STRATEGIES:
+            reordered = reorder(iter(points), strategy=strategy)
+            self.assertEqual(sorted(reordered), sorted(points))
+            self.assertLess(reordered.after, reordered.before / 4)
+            self.assertAlmostEqual(reordered.before,
+                                   sum(map(euclidean, points, points[1:])))
+        nearest = reorder(iter(points), strategy="nearest")
+        twoopt = reorder(iter(points), strategy="2opt")
+        self.assertLessEqual(twoopt.after, nearest.after)
+
     def test_reservoirscan(self):
         random.seed(0)
         truth = [(4, 5), (2, 0), (1, 0), (2, 1), (1, 4)]
@@ -110,6 +829,32 @@ class TestPixelscan(unittest.TestCase):
             self.assertEqual(point, truth[index])
         self.assertEqual(index+1, len(truth))
 
+    def test_rotatescan(self):
+        truth = [(0, 0), (-1, 1), (0, 1), (1, 1), (-1, 2), (0, 2), (1, 2),
+                 (0, 3)]
+        x0, y0, x1, y1 = 0, 0, 2, 2
+        points = rotatescan(x0, y0, x1, y1, angle=45)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+
+    def test_rotatescan_quadrant(self):
+        truth = [(-1, 0), (0, 0), (-1, 1), (0, 1), (-1, 2), (0, 2)]
+        x0, y0, x1, y1 = 0, 0, 2, 1
+        points = rotatescan(x0, y0, x1, y1, angle=90)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+        rotated = snap(rotation(gridscan(x0, y0, x1, y1), angle=90))
+        self.assertEqual(sorted(truth), sorted(rotated))
+
+    def test_rotatescan_chunks(self):
+        x0, y0, x1, y1 = -3, 2, 5, 7
+        points = list(rotatescan(x0, y0, x1, y1, angle=30))
+        self.assertEqual(len(points), len(set(points)))
+        chunks = rotatescan(x0, y0, x1, y1, angle=30, chunksize=10)
+        self.assertEqual([p for chunk in chunks for p in chunk], points)
+
     def test_ringscan_badmetric(self):
         def badmetric(x, y):
             return 3
@@ -148,6 +893,14 @@ class TestPixelscan(unittest.TestCase):
             self.assertEqual(point, truth[index])
         self.assertEqual(index+1, len(truth))
 
+    def test_mortonscan3d(self):
+        truth = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0), (0, 0, 1),
+                 (1, 0, 1), (0, 1, 1), (1, 1, 1), (2, 0, 0)]
+        points = mortonscan3d(4, 9)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+
     def test_snakescan(self):
         truth = [(0, 0), (1, 0), (2, 0), (2, 1), (1, 1),
                  (0, 1), (0, 2), (1, 2), (2, 2)]
@@ -157,6 +910,22 @@ class TestPixelscan(unittest.TestCase):
             self.assertEqual(point, truth[index])
         self.assertEqual(index+1, len(truth))
 
+    def test_snakescan3d(self):
+        truth = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0, 1, 1),
+                 (1, 1, 1), (1, 0, 1), (0, 0, 1)]
+        x0, y0, z0, x1, y1, z1 = 0, 0, 0, 1, 1, 1
+        points = snakescan3d(x0, y0, z0, x1, y1, z1)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+
+    def test_snakescan_index_of(self):
+        x0, y0, x1, y1 = 2, 0, 0, 3
+        points = list(snakescan(x0, y0, x1, y1))
+        scan = snakescan(x0, y0, x1, y1)
+        for index, point in enumerate(points):
+            self.assertEqual(scan.index_of(*point), index)
+
     def test_snakescan_clip(self):
         truth = [(2, 1), (1, 1), (1, 2), (2, 2)]
         x0, y0, x1, y1 = 0, 0, 2, 2
@@ -193,6 +962,17 @@ class TestPixelscan(unittest.TestCase):
         npoints = len([point for point in enumerate(points)])
         self.assertEqual(npoints, len(truth))
 
+    def test_snakescan_clip_vectorized_abort(self):
+        def predicate(xs, ys):
+            return [y < 1 or x > 0 for x, y in zip(xs, ys)]
+        truth = [(0, 0), (1, 0), (2, 0), (2, 1), (1, 1)]
+        x0, y0, x1, y1 = 0, 0, 2, 2
+        points = clip(snakescan(x0, y0, x1, y1), predicate=predicate,
+                      vectorized=True, abort=True)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+
     def test_snakescan_skip(self):
         truth = [(0, 0), (2, 0), (1, 1), (0, 2), (2, 2)]
         x0, y0, x1, y1 = 0, 0, 2, 2
@@ -239,6 +1019,36 @@ class TestPixelscan(unittest.TestCase):
             self.assertEqual(point, truth[index])
         self.assertEqual(index+1, len(truth))
 
+    def test_snakescan_spans(self):
+        truth = [Span(0, -1, -3, -1), Span(1, -3, -1, 1),
+                 Span(2, -1, -3, -1)]
+        spans = translation(snakescan(0, 0, 3, 2).spans(), tx=1)
+        spans = reflection(clip(spans, maxx=3), rx=True)
+        for index, span in enumerate(spans):
+            self.assertEqual(span, truth[index])
+        self.assertEqual(index+1, len(truth))
+
+    def test_snakescan_spans_clip_predicate(self):
+        truth = [Span(0, 0, 1, 1), Span(0, 3, 3, 1), Span(1, 3, 3, -1),
+                 Span(1, 1, 0, -1)]
+        spans = clip(snakescan(0, 0, 4, 1).spans(), maxx=3,
+                     predicate=lambda x, y: x != 2)
+        for index, span in enumerate(spans):
+            self.assertEqual(span, truth[index])
+        self.assertEqual(index+1, len(truth))
+        spans = clip(snakescan(0, 0, 4, 1).spans(), maxx=3,
+                     predicate=lambda x, y: x != 2, abort=True)
+        self.assertEqual(list(spans), truth[:1])
+
+    def test_snakescan_spans_unsupported(self):
+        for transformation in (lambda scan: rotation(scan, 90),
+                               lambda scan: sample(scan, 0.5),
+                               lambda scan: scale(scan, 2),
+                               lambda scan: skip(scan, step=2),
+                               snap, swap, unique):
+            spans = transformation(snakescan(0, 0, 2, 2).spans())
+            self.assertRaises(TypeError, next, spans)
+
     def test_snakescan_translation(self):
         truth = [(1, 1), (2, 1), (3, 1), (3, 2), (2, 2),
                  (1, 2), (1, 3), (2, 3), (3, 3)]
@@ -257,6 +1067,34 @@ class TestPixelscan(unittest.TestCase):
             self.assertEqual(point, truth[index])
         self.assertEqual(index+1, len(truth))
 
+    def test_snakescan_unique(self):
+        truth = [(0, 0), (1, 0), (1, 1), (0, 1), (0, 2), (1, 2)]
+        x0, y0, x1, y1 = 0, 0, 2, 2
+        points = unique(snap(scale(snakescan(x0, y0, x1, y1), sx=0.5)),
+                        minx=0, maxx=1, miny=0, maxy=1)
+        for index, point in enumerate(points):
+            self.assertEqual(point, truth[index])
+        self.assertEqual(index+1, len(truth))
+        self.assertEqual(points.total, 9)
+        self.assertAlmostEqual(points.coverage, 6.0 / 9.0)
+
+    def test_walkscan_unique(self):
+        x0, y0 = 0, 0
+        points = unique(skip(walkscan(x0, y0, seed=3), stop=999),
+                        minx=-10, maxx=10, miny=-10, maxy=10)
+        visited = list(points)
+        self.assertEqual(len(visited), len(set(visited)))
+        self.assertEqual(points.count, len(visited))
+        self.assertEqual(points.total, 1000)
+        chunks = unique(walkscan(x0, y0, chunksize=100, seed=3))
+        walk = walkscan(x0, y0, chunksize=100, seed=3)
+        visited = set()
+        for index in range(10):
+            visited.update(next(walk))
+            next(chunks)
+        self.assertEqual(chunks.count, len(visited))
+        self.assertAlmostEqual(chunks.coverage, len(visited) / 1000.0)
+
     def test_walkscan_abort(self):
         random.seed(0)
         truth = [(0, 0), (0, 1), (0, 2), (1, 2),
@@ -277,6 +1115,61 @@ class TestPixelscan(unittest.TestCase):
             self.assertEqual(point, truth[index])
         self.assertEqual(index+1, len(truth))
 
+    def test_walkscan_checkpoint(self):
+        random.seed(0)
+        x0, y0 = 0, 0
+        points = sample(walkscan(x0, y0), probability=0.5)
+        for index in range(10):
+            next(points)
+        checkpoint = pickle.dumps(points)
+        truth = [next(points) for index in range(10)]
+        points = pickle.loads(checkpoint)
+        self.assertEqual([next(points) for index in range(10)], truth)
+        chunks = walkscan(x0, y0, chunksize=10, seed=1)
+        next(chunks)
+        checkpoint = pickle.dumps(chunks)
+        truth = next(chunks)
+        self.assertEqual(next(pickle.loads(checkpoint)), truth)
+
+    def test_walkscan_chunks(self):
+        truth = [[(0, 0), (1, 0), (2, 0)], [(3, 0), (4, 0), (5, 0)]]
+        x0, y0 = 0, 0
+        chunks = walkscan(x0, y0, xn=0, xp=1, yn=0, yp=0, chunksize=3)
+        for index, truthchunk in enumerate(truth):
+            self.assertEqual(next(chunks).tolist(), truthchunk)
+
+    def test_walkscan_probabilities(self):
+        x0, y0, n = 0, 0, 100000
+        probabilities = {(-1, 0): 0.1, (1, 0): 0.2, (0, -1): 0.3, (0, 1): 0.4}
+        for chunksize in (None, 1000):
+            walk = walkscan(x0, y0, xn=0.1, xp=0.2, yn=0.3, yp=0.4,
+                            chunksize=chunksize, seed=5)
+            if chunksize is None:
+                points = list(itertools.islice(walk, n + 1))
+            else:
+                points = sum((next(walk).tolist() for index in range(100)),
+                             [])[:n + 1]
+            counts = {}
+            for (xa, ya), (xb, yb) in zip(points, points[1:]):
+                step = (xb - xa, yb - ya)
+                counts[step] = counts.get(step, 0) + 1
+            self.assertEqual(sorted(counts), sorted(probabilities))
+            for step, probability in probabilities.items():
+                self.assertAlmostEqual(counts[step] / n, probability,
+                                       delta=0.01)
+
+    def test_walkscan_chunks_seed(self):
+        x0, y0 = 0, 0
+        walk1 = walkscan(x0, y0, xn=0.1, xp=0.2, yn=0.3, yp=0.4,
+                         chunksize=100, seed=7)
+        walk2 = walkscan(x0, y0, xn=0.1, xp=0.2, yn=0.3, yp=0.4,
+                         chunksize=100, seed=7)
+        for index in range(3):
+            chunk1, chunk2 = next(walk1), next(walk2)
+            self.assertEqual(chunk1, chunk2)
+            for (xa, ya), (xb, yb) in zip(chunk1, list(chunk1)[1:]):
+                self.assertEqual(abs(xb - xa) + abs(yb - ya), 1)
+
 
 if __name__ == "__main__":
     unittest.main()